@@ -1 +1,10 @@
+from .corpus import TaggedCorpus
+from .corpus import build_tagged_corpus
+from .corpus import load_tagged_corpus
 from .doc2vec import RepresentationGenerator
+from .doc2vec import load_doc2vec
+from .doc2vec import save_doc2vec
+from .docvec_store import DocvecStore
+from .docvec_store import file_hash
+from .docvec_store import inference_key
+from .docvec_store import model_fingerprint
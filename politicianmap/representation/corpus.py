@@ -0,0 +1,185 @@
+from array import array
+import numpy as np
+import os
+
+
+_CORPUS_FILES = ['tokens', 'tokenptr', 'tags', 'tagptr', 'vocab', 'taglist']
+
+def build_tagged_corpus(tagged_documents, path, verbose=True, inputs=None):
+    """
+    Convert tagged documents into integer id token stream once.
+
+    Arguments
+    ---------
+    tagged_documents : Any type iterable data that yield object having words and tags
+        For example, iterable of gensim.models.doc2vec.TaggedDocument
+    path : str
+        Path prefix of corpus.
+        It creates {path}.vocab, {path}.taglist and int arrays
+        {path}.tokens, {path}.tokenptr, {path}.tags, {path}.tagptr.
+        Files are written to temporal path and renamed at the end, and
+        {path}.inputs is written last as a mark of complete corpus
+    inputs : list of str or None
+        Input file paths of tagged_documents. Their (size, mtime) are stored
+        in {path}.inputs to check whether the corpus is up to date
+
+    Usage
+    -----
+        >>> build_tagged_corpus(Input(news), 'doc2vec_corpus/politician_0')
+        >>> doc2vec = Doc2Vec(TaggedCorpus('doc2vec_corpus/politician_0'), min_count=15)
+    """
+    dirname = os.path.dirname(os.path.abspath(path))
+    if not os.path.exists(dirname):
+        os.makedirs(dirname)
+    final_path = path
+    path = '{}.{}.tmp'.format(final_path, os.getpid())
+
+    vocab_to_idx = {}
+    tag_to_idx = {}
+    tokens, tags = array('i'), array('i')
+    token_ptr, tag_ptr = array('q', [0]), array('q', [0])
+    n_tokens, n_tags, n_docs = 0, 0, 0
+
+    def flush(f, buffer):
+        buffer.tofile(f)
+        del buffer[:]
+
+    with open('{}.tokens'.format(path), 'wb') as f_tokens, \
+         open('{}.tokenptr'.format(path), 'wb') as f_token_ptr, \
+         open('{}.tags'.format(path), 'wb') as f_tags, \
+         open('{}.tagptr'.format(path), 'wb') as f_tag_ptr:
+
+        for doc in tagged_documents:
+            for word in doc.words:
+                idx = vocab_to_idx.get(word, -1)
+                if idx == -1:
+                    idx = len(vocab_to_idx)
+                    vocab_to_idx[word] = idx
+                tokens.append(idx)
+            for tag in doc.tags:
+                idx = tag_to_idx.get(tag, -1)
+                if idx == -1:
+                    idx = len(tag_to_idx)
+                    tag_to_idx[tag] = idx
+                tags.append(idx)
+            n_tokens += len(doc.words)
+            n_tags += len(doc.tags)
+            token_ptr.append(n_tokens)
+            tag_ptr.append(n_tags)
+            n_docs += 1
+            if len(tokens) >= 1000000:
+                flush(f_tokens, tokens)
+                flush(f_token_ptr, token_ptr)
+                flush(f_tags, tags)
+                flush(f_tag_ptr, tag_ptr)
+
+        flush(f_tokens, tokens)
+        flush(f_token_ptr, token_ptr)
+        flush(f_tags, tags)
+        flush(f_tag_ptr, tag_ptr)
+
+    _write_list('{}.vocab'.format(path), vocab_to_idx)
+    _write_list('{}.taglist'.format(path), tag_to_idx)
+
+    # a corpus without .inputs is incomplete, even if some files are renamed
+    inputs_path = '{}.inputs'.format(final_path)
+    if os.path.exists(inputs_path):
+        os.remove(inputs_path)
+    for ext in _CORPUS_FILES:
+        os.replace('{}.{}'.format(path, ext), '{}.{}'.format(final_path, ext))
+    _write_input_stats('{}.inputs'.format(path), inputs)
+    os.replace('{}.inputs'.format(path), inputs_path)
+    if verbose:
+        print('built corpus {}: {} docs, {} tokens, {} vocabs'.format(
+            final_path, n_docs, n_tokens, len(vocab_to_idx)))
+
+def _write_list(path, item_to_idx):
+    # dict keeps insertion order, and it is same with index order
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in item_to_idx:
+            f.write('{}\n'.format(item))
+
+def _read_list(path):
+    with open(path, encoding='utf-8') as f:
+        return [line[:-1] for line in f]
+
+def _input_stats(inputs):
+    stats = []
+    for p in sorted(inputs):
+        stat = os.stat(p)
+        stats.append((os.path.abspath(p), str(stat.st_size), str(stat.st_mtime_ns)))
+    return stats
+
+def _write_input_stats(path, inputs):
+    with open(path, 'w', encoding='utf-8') as f:
+        for stat in _input_stats(inputs if inputs is not None else []):
+            f.write('{}\n'.format('\t'.join(stat)))
+
+def corpus_exists(path, inputs=None):
+    """
+    True if complete corpus exists. If inputs is not None, the corpus must be
+    built from the same input files with same (size, mtime)
+    """
+    if not all(os.path.exists('{}.{}'.format(path, ext)) for ext in _CORPUS_FILES + ['inputs']):
+        return False
+    if inputs is None:
+        return True
+    with open('{}.inputs'.format(path), encoding='utf-8') as f:
+        stats = [tuple(line[:-1].split('\t')) for line in f]
+    return stats == _input_stats(inputs)
+
+def load_tagged_corpus(tagged_documents, path, header='', rebuild=False, inputs=None):
+    """
+    Build corpus from tagged_documents only when it does not exist, input files
+    are changed (or rebuild is True), and return TaggedCorpus streaming from it.
+
+        >>> corpus = load_tagged_corpus(Input(news), 'doc2vec_corpus/politician_0',
+        >>>     header='#0', inputs=news.newspath)
+    """
+    if rebuild or not corpus_exists(path, inputs):
+        build_tagged_corpus(tagged_documents, path, inputs=inputs)
+    return TaggedCorpus(path, header)
+
+
+class TaggedCorpus:
+    """
+    Iterable of TaggedDocument streamed from memory-mapped corpus built by build_tagged_corpus.
+    It can be iterated many times (epochs) without reading and splitting text files.
+
+        >>> corpus = TaggedCorpus('doc2vec_corpus/politician_0', header='[Politician 0]')
+        >>> doc2vec = Doc2Vec(corpus, min_count=15)
+    """
+
+    def __init__(self, path, header=''):
+        self.path = path
+        self.header = header
+        self.idx_to_vocab = np.asarray(_read_list('{}.vocab'.format(path)), dtype=object)
+        self.idx_to_tag = np.asarray(_read_list('{}.taglist'.format(path)), dtype=object)
+        self.tokens = _load_array('{}.tokens'.format(path), np.int32)
+        self.token_ptr = _load_array('{}.tokenptr'.format(path), np.int64)
+        self.tags = _load_array('{}.tags'.format(path), np.int32)
+        self.tag_ptr = _load_array('{}.tagptr'.format(path), np.int64)
+        self.n_docs = self.token_ptr.shape[0] - 1
+        self.n_iter = 0
+
+    def __len__(self):
+        return self.n_docs
+
+    def __iter__(self):
+        from gensim.models.doc2vec import TaggedDocument
+
+        token_ptr = self.token_ptr.tolist()
+        tag_ptr = self.tag_ptr.tolist()
+        for i in range(self.n_docs):
+            if i % 100000 == 0:
+                print('\r{} iter = {}, docs = {} / {} ...'.format(self.header, self.n_iter, i, self.n_docs), end='')
+            words = self.idx_to_vocab[self.tokens[token_ptr[i]:token_ptr[i+1]]].tolist()
+            tags = self.idx_to_tag[self.tags[tag_ptr[i]:tag_ptr[i+1]]].tolist()
+            yield TaggedDocument(words=words, tags=tags)
+        self.n_iter += 1
+        print('\r{0} iter = {1}, docs = {2} / {2} was done'.format(self.header, self.n_iter, self.n_docs))
+
+def _load_array(path, dtype):
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r')
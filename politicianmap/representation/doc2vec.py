@@ -1,26 +1,187 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import os
 import pickle
+import sys
+import warnings
+import zlib
+
+
+def _split(doc):
+    return doc.split()
+
+def save_doc2vec(doc2vec, path):
+    """
+    Arguments
+    ---------
+    doc2vec : gensim.models.Doc2Vec
+        Trained model
+    path : str
+        Model path. Large arrays (word, doc and output vectors) are stored
+        as separate {path}.*.npy files, so they can be memory-mapped by load_doc2vec.
+
+    Usage
+    -----
+        >>> save_doc2vec(doc2vec, 'doc2vec_politician_all.model')
+
+    To convert a pickled model,
+
+        >>> save_doc2vec(load_doc2vec('doc2vec_politician_all.pkl'), 'doc2vec_politician_all.model')
+    """
+    doc2vec.save(path, sep_limit=1024 * 1024)
+
+def load_doc2vec(path, mmap='r'):
+    """
+    Arguments
+    ---------
+    path : str
+        Model path created by save_doc2vec. If it ends with .pkl, it is unpickled.
+    mmap : str or None
+        Memory map mode of vector arrays. With 'r', processes loading same model
+        share the pages of vectors and loading does not read whole arrays.
+
+    Returns
+    -------
+    gensim.models.Doc2Vec
+    """
+    if path[-4:] == '.pkl':
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+    from gensim.models import Doc2Vec
+    return Doc2Vec.load(path, mmap=mmap)
 
 class RepresentationGenerator:
+    """
+        >>> encoder = RepresentationGenerator('doc2vec_politician_all.model', Tokenizer(Tagfilter({'R'})))
+        >>> vec = encoder.infer_docvec(docs, steps=100)
+
+    doc2vec_path is a model saved by save_doc2vec, and its vectors are memory-mapped
+    (read only). A pickled model (.pkl) is also available but it is loaded into memory.
+
+    gensim initializes the vector of inference with hash(' '.join(words)), and builtin
+    hash of str differs between processes. The generator replaces the hash function
+    of the model with crc32, so inferred vectors with same seed are same in any process.
+    If the gensim version has no hash function to replace, the vectors are reproducible
+    only when PYTHONHASHSEED is fixed (for example, PYTHONHASHSEED=0).
+    """
+
     def __init__(self, doc2vec_path, tokenizer=None,
         alpha=0.025, min_alpha=0.01, steps=10):
 
         if tokenizer is None:
-            tokenizer = lambda x:x.split()
-        with open(doc2vec_path, 'rb') as f:
-            self.doc2vec = pickle.load(f)
+            tokenizer = _split
+        self.doc2vec = load_doc2vec(doc2vec_path)
+        _use_stable_hash(self.doc2vec)
+        self.doc2vec_path = doc2vec_path
         self.tokenizer = tokenizer
         self.alpha = alpha
         self.min_alpha = min_alpha
         self.steps = steps
 
-    def infer_docvec(self, docs, alpha=None, min_alpha=None, steps=None):
+    def infer_docvec(self, docs, alpha=None, min_alpha=None, steps=None, seed=None):
         if isinstance(docs, str):
             docs = [docs]
         alpha = self.alpha if alpha is None else alpha
         min_alpha = self.min_alpha if min_alpha is None else min_alpha
         steps = self.steps if steps is None else steps
+        if seed is not None:
+            # inference samples negative words and windows with model.random
+            self.doc2vec.random = np.random.RandomState(seed)
 
         words = [w for doc in docs for w in self.tokenizer(doc)]
         vec = self.doc2vec.infer_vector(words, alpha=alpha,
             min_alpha=min_alpha, steps=steps)
         return vec
+
+    def infer_many(self, date_docs, n_jobs=1, alpha=None, min_alpha=None, steps=None, seed=0, verbose=True):
+        """
+        Arguments
+        ---------
+        date_docs : Any type iterable data that yield (date, [doc])
+            For example, DateDocsDecorator
+        n_jobs : int
+            Number of processes. Each process loads the model once.
+        alpha, min_alpha, steps :
+            Same with infer_docvec
+        seed : int
+            Random seed. The vector of a date is inferred with seed derived from
+            (seed, date), so the result does not depend on n_jobs or order of dates.
+            See the class docstring for the initial vector of inference.
+        verbose : Boolean
+            If True, print progress
+
+        Returns
+        -------
+        list of tuple
+            Each tuple is (date, numpy.ndarray). It keeps the order of date_docs
+
+        Usage
+        -----
+            >>> encoder = RepresentationGenerator(doc2vec_path, Tokenizer(Tagfilter({'R'})))
+            >>> date_docvecs = encoder.infer_many(DateDocsDecorator(news, min_doc=15), n_jobs=8, steps=100)
+        """
+        params = (alpha, min_alpha, steps, seed)
+        if n_jobs <= 1:
+            results = (self._infer_a_date(date, docs, params) for date, docs in date_docs)
+        else:
+            executor = ProcessPoolExecutor(n_jobs, initializer=_initialize_worker,
+                initargs=(self.doc2vec_path, self.tokenizer, self.alpha, self.min_alpha, self.steps))
+            results = _ordered_map(executor, _infer_in_worker,
+                ((date, docs, params) for date, docs in date_docs), max_pending=4 * n_jobs)
+
+        date_docvecs = []
+        for i, (date, vec) in enumerate(results):
+            date_docvecs.append((date, vec))
+            if verbose and i % 100 == 99:
+                print('\rinfering ... {} dates'.format(i+1), end='')
+        if n_jobs > 1:
+            executor.shutdown()
+        if verbose:
+            print('\rinfering {} dates was done'.format(len(date_docvecs)))
+        return date_docvecs
+
+    def _infer_a_date(self, date, docs, params):
+        alpha, min_alpha, steps, seed = params
+        vec = self.infer_docvec(docs, alpha=alpha, min_alpha=min_alpha,
+            steps=steps, seed=_date_seed(seed, date))
+        return date, vec
+
+
+def _stable_hash(string):
+    return zlib.crc32(string.encode('utf-8'))
+
+def _use_stable_hash(doc2vec):
+    # gensim 3 seeds the initial vector with trainables.seeded_vector (model.seeded_vector
+    # in older versions) using hashfxn. gensim 4 always uses builtin hash
+    trainables = getattr(doc2vec, 'trainables', None)
+    if trainables is not None and hasattr(trainables, 'hashfxn'):
+        trainables.hashfxn = _stable_hash
+    elif not hasattr(doc2vec, 'dv') and hasattr(doc2vec, 'hashfxn'):
+        doc2vec.hashfxn = _stable_hash
+    elif sys.flags.hash_randomization and 'PYTHONHASHSEED' not in os.environ:
+        warnings.warn('Inferred vectors differ between processes. Set PYTHONHASHSEED to reproduce them')
+
+def _date_seed(seed, date):
+    # stable across processes unlike hash(str)
+    return zlib.crc32('{}_{}'.format(seed, date).encode('utf-8'))
+
+_worker_generator = None
+
+def _initialize_worker(doc2vec_path, tokenizer, alpha, min_alpha, steps):
+    global _worker_generator
+    _worker_generator = RepresentationGenerator(doc2vec_path, tokenizer, alpha, min_alpha, steps)
+
+def _infer_in_worker(args):
+    date, docs, params = args
+    return _worker_generator._infer_a_date(date, docs, params)
+
+def _ordered_map(executor, func, iterable, max_pending):
+    # executor.map submits all items at once. This keeps at most max_pending
+    # tasks (and their documents) in memory and yields results in input order
+    pending = []
+    for item in iterable:
+        pending.append(executor.submit(func, item))
+        if len(pending) >= max_pending:
+            yield pending.pop(0).result()
+    for future in pending:
+        yield future.result()
@@ -0,0 +1,214 @@
+from glob import glob
+import hashlib
+import numpy as np
+import os
+
+
+class DocvecStore:
+    """
+    Append-only store of inferred date vectors.
+    Each vector is saved with its date and key, and the key identifies
+    (model, content of date file, inference parameters). A rerun infers only
+    dates whose key is not in the store.
+
+        >>> store = DocvecStore('docvec_infered/each_0_docvec')
+        >>> key = inference_key(model_fingerprint(doc2vec_path), store.content_key(news.get_path(date)), params)
+        >>> if store.get(date, key) is None:
+        >>>     store.append(date, key, encoder.infer_docvec(docs))
+        >>> docvecs = store.vectors(dates)
+
+    Files
+    -----
+    {path}.vec : float32 vectors, one row per appended vector
+    {path}.index : 'dim {dim}' header and lines of 'date<TAB>key<TAB>row'.
+        The last row of a date is used.
+    {path}.hashes : lines of 'path<TAB>size<TAB>mtime<TAB>sha1' of date files.
+        Content hash of a file is reused while its (size, mtime) is not changed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.vec_path = '{}.vec'.format(path)
+        self.index_path = '{}.index'.format(path)
+        self.hashes_path = '{}.hashes'.format(path)
+        self.dim = None
+        self.n_rows = 0
+        self.date_to_row = {}
+        self._hashes = None
+        if os.path.exists(self.index_path):
+            self._load_index()
+
+    def _load_index(self):
+        # remove a line written partially (interrupted append)
+        _truncate_partial_line(self.index_path)
+        with open(self.index_path, encoding='utf-8') as f:
+            header = next(f, '').split()
+            if header:
+                self.dim = int(header[1])
+            for line in f:
+                cols = line.strip().split('\t')
+                if len(cols) != 3:
+                    continue
+                date, key, row = cols
+                self.date_to_row[date] = (key, int(row))
+                self.n_rows = max(self.n_rows, int(row) + 1)
+        # remove vectors written without index line (interrupted append)
+        if os.path.exists(self.vec_path):
+            n_bytes = 0 if self.dim is None else self.n_rows * self.dim * 4
+            if os.path.getsize(self.vec_path) > n_bytes:
+                with open(self.vec_path, 'r+b') as f:
+                    f.truncate(n_bytes)
+
+    def content_key(self, path):
+        """
+        file_hash of path. It is computed only when (size, mtime) of the file
+        is changed after the last computation, otherwise the stored hash is used.
+        """
+        if self._hashes is None:
+            self._hashes = {}
+            if os.path.exists(self.hashes_path):
+                _truncate_partial_line(self.hashes_path)
+                with open(self.hashes_path, encoding='utf-8') as f:
+                    for line in f:
+                        cols = line[:-1].split('\t')
+                        if len(cols) == 4:
+                            self._hashes[cols[0]] = (cols[1], cols[2], cols[3])
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        size, mtime = str(stat.st_size), str(stat.st_mtime_ns)
+        cached = self._hashes.get(path)
+        if cached is not None and cached[:2] == (size, mtime):
+            return cached[2]
+        sha1 = file_hash(path)
+        self._hashes[path] = (size, mtime, sha1)
+        dirname = os.path.dirname(os.path.abspath(self.hashes_path))
+        if not os.path.exists(dirname):
+            os.makedirs(dirname)
+        with open(self.hashes_path, 'a', encoding='utf-8') as f:
+            f.write('{}\t{}\t{}\t{}\n'.format(path, size, mtime, sha1))
+        return sha1
+
+    def __len__(self):
+        return len(self.date_to_row)
+
+    def get(self, date, key=None):
+        """
+        Arguments
+        ---------
+        date : str
+            yyyy-mm-dd format
+        key : str or None
+            If not None, return vector only when stored key is same
+
+        Returns
+        -------
+        numpy.ndarray or None
+        """
+        if date not in self.date_to_row:
+            return None
+        key_, row = self.date_to_row[date]
+        if key is not None and key != key_:
+            return None
+        return self._read(row)
+
+    def append(self, date, key, vec):
+        """
+        Arguments
+        ---------
+        date : str
+            yyyy-mm-dd format
+        key : str
+            Output of inference_key
+        vec : numpy.ndarray
+            (dim,) shape vector
+        """
+        vec = np.asarray(vec, dtype=np.float32).reshape(-1)
+        if self.dim is None:
+            self.dim = vec.shape[0]
+            dirname = os.path.dirname(os.path.abspath(self.path))
+            if not os.path.exists(dirname):
+                os.makedirs(dirname)
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                f.write('dim {}\n'.format(self.dim))
+        if vec.shape[0] != self.dim:
+            raise ValueError('Vector dimension must be {}, but {}'.format(self.dim, vec.shape[0]))
+        row = self.n_rows
+        with open(self.vec_path, 'ab') as f:
+            f.write(vec.tobytes())
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write('{}\t{}\t{}\n'.format(date, key, row))
+        self.n_rows += 1
+        self.date_to_row[date] = (key, row)
+
+    def vectors(self, dates):
+        """
+        Arguments
+        ---------
+        dates : list of str
+            Dates in the store
+
+        Returns
+        -------
+        numpy.ndarray
+            (len(dates), dim) shape matrix
+        """
+        matrix = self._matrix()
+        rows = [self.date_to_row[date][1] for date in dates]
+        return np.asarray(matrix[rows])
+
+    def _matrix(self):
+        if self.n_rows == 0:
+            return np.zeros((0, 0 if self.dim is None else self.dim), dtype=np.float32)
+        return np.memmap(self.vec_path, dtype=np.float32, mode='r', shape=(self.n_rows, self.dim))
+
+    def _read(self, row):
+        return np.array(self._matrix()[row])
+
+
+def _truncate_partial_line(path):
+    # bytes after the last newline are a line written partially
+    with open(path, 'rb') as f:
+        data = f.read()
+    n_bytes = data.rfind(b'\n') + 1
+    if n_bytes < len(data):
+        with open(path, 'r+b') as f:
+            f.truncate(n_bytes)
+
+def file_hash(path):
+    """sha1 of file content"""
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+def model_fingerprint(path):
+    """
+    Fingerprint of a model saved by save_doc2vec (or a pickled model).
+    It hashes content of the model file and (name, size, mtime) of its .npy array files,
+    so it does not read large arrays.
+    """
+    sha1 = hashlib.sha1(file_hash(path).encode('utf-8'))
+    for array_path in sorted(glob('{}.*.npy'.format(path))):
+        stat = os.stat(array_path)
+        sha1.update('{} {} {}'.format(os.path.basename(array_path), stat.st_size, stat.st_mtime).encode('utf-8'))
+    return sha1.hexdigest()
+
+def inference_key(model_key, content_key, params):
+    """
+    Arguments
+    ---------
+    model_key : str
+        Output of model_fingerprint
+    content_key : str
+        Output of file_hash of date file
+    params : dict
+        Inference parameters such as steps, alpha and seed
+
+    Returns
+    -------
+    str
+        sha1 hex digest
+    """
+    params = ','.join('{}={}'.format(k, v) for k, v in sorted(params.items()))
+    return hashlib.sha1('{}|{}|{}'.format(model_key, content_key, params).encode('utf-8')).hexdigest()
@@ -1,3 +1,7 @@
 from .segmentor import find_rectangular
+from .segmentor import SummedAreaTable
 from .segmentor import point_shift_distance
 from .segmentor import shift_distance
+from .banded import BandedDistance
+from .banded import find_rectangular_banded
+from .online import OnlineSegmentor
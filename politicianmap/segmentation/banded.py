@@ -0,0 +1,201 @@
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+from .segmentor import find_rectangular
+
+
+class BandedDistance:
+    """
+    Pairwise cosine distance of date vectors, computed and stored only on
+    the diagonal band |i - j| <= bandwidth. Memory is O(n * bandwidth) instead of O(n^2).
+    It has same interface with SummedAreaTable, so find_rectangular and shift_distance
+    run on it directly as long as every queried block lies in the band.
+
+        >>> band = BandedDistance(docvec, bandwidth=30)
+        >>> segments = find_rectangular(band, threshold=0.5, min_length=5, max_length=30)
+
+    Arguments
+    ---------
+    x : numpy.ndarray or scipy.sparse matrix
+        (n dates, dim) date vectors. Dense docvecs or sparse BOW
+    bandwidth : int
+        Maximum |i - j| of stored distance
+    metric : str
+        Only 'cosine' is available
+    transform : callable or None
+        Elementwise function applied to distance values such as scaling.
+        It takes numpy.ndarray and returns same shape numpy.ndarray
+    """
+
+    def __init__(self, x, bandwidth, metric='cosine', transform=None):
+        if metric != 'cosine':
+            raise ValueError('Only cosine metric is available')
+        self.bandwidth = bandwidth
+        self.transform = transform
+        n = x.shape[0]
+        self.shape = (n, n)
+        self.band = np.zeros((n, 2 * bandwidth + 1))
+        self.table = np.zeros((n + 1, 2 * bandwidth + 1))
+        x = normalize(x)
+        self._fill(x, 0, 0)
+        self._accumulate(0)
+        self._tail = x[max(0, n - bandwidth):]
+
+    def append(self, x):
+        """
+        Append date vectors. Only the distances between new dates and
+        the last bandwidth dates and the prefix sums from the last bandwidth
+        dates are computed. Its cost is O(bandwidth^2) for a date.
+
+        Argument
+        --------
+        x : numpy.ndarray or scipy.sparse matrix
+            (n new dates, dim) date vectors
+        """
+        W = self.bandwidth
+        begin = self.shape[0]
+        n = begin + x.shape[0]
+        self.shape = (n, n)
+        if self.band.shape[0] < n:
+            capacity = max(n, 2 * self.band.shape[0])
+            self.band = _resize(self.band, capacity)
+            self.table = _resize(self.table, capacity + 1)
+        x = normalize(x)
+        x = sp.vstack([self._tail, x]).tocsr() if sp.issparse(x) else np.vstack([self._tail, x])
+        self._fill(x, begin - self._tail.shape[0], begin)
+        self._accumulate(max(0, begin - W))
+        self._tail = x[max(0, x.shape[0] - W):]
+
+    def _fill(self, x, offset, begin):
+        """
+        fill distances d(i, j) with j >= begin and |i - j| <= bandwidth.
+        x has normalized vectors of rows [offset, n) and offset <= begin - bandwidth
+        """
+        W = self.bandwidth
+        n = self.shape[0]
+        for k in range(1, W + 1):
+            b = max(begin - k, 0)
+            if n - k <= b:
+                break
+            xb = x[b-offset:n-k-offset]
+            xe = x[b+k-offset:n-offset]
+            if sp.issparse(x):
+                sim = np.asarray(xb.multiply(xe).sum(axis=1)).reshape(-1)
+            else:
+                sim = (xb * xe).sum(axis=1)
+            dist = np.clip(1 - sim, 0, 2)
+            if self.transform is not None:
+                dist = self.transform(dist)
+            # d(i, i+k) and d(i+k, i)
+            self.band[b:n-k, W+k] = dist
+            self.band[b+k:n, W-k] = dist
+        rows = np.arange(begin, n)
+        diag = np.zeros(n - begin)
+        if self.transform is not None:
+            diag = self.transform(diag)
+        self.band[rows, W] = diag
+
+    def _accumulate(self, begin):
+        """update prefix sum rows (begin, n]"""
+        W = self.bandwidth
+        t = self.table
+        for i in range(begin, self.shape[0]):
+            cumsum = np.cumsum(self.band[i])
+            t[i+1, :2*W] = t[i, 1:] + cumsum[:2*W]
+            t[i+1, 2*W] = t[i, 2*W] + cumsum[2*W]
+
+    def __getitem__(self, index):
+        i, j = index
+        if abs(i - j) > self.bandwidth:
+            raise ValueError('({}, {}) is out of band'.format(i, j))
+        return self.band.item(i, j - i + self.bandwidth)
+
+    def _prefix(self, i, j):
+        # prefix sum of band-masked distance matrix. Out of band values are
+        # same with the value at the edge of band
+        if i <= 0 or j <= 0:
+            return 0.0
+        W = self.bandwidth
+        n = self.shape[0]
+        j = min(j, n)
+        if j - i > W:
+            j = i + W
+        elif i - j > W:
+            i = j + W
+        i = min(i, n)
+        return self.table.item(i, j - i + W)
+
+    def sum(self, b0, e0, b1, e1):
+        e0 = min(e0, self.shape[0])
+        e1 = min(e1, self.shape[1])
+        if max(e1 - 1 - b0, e0 - 1 - b1) > self.bandwidth:
+            raise ValueError('Block [{}:{}, {}:{}] is out of band {}'.format(
+                b0, e0, b1, e1, self.bandwidth))
+        p = self._prefix
+        return p(e0, e1) - p(b0, e1) - p(e0, b1) + p(b0, b1)
+
+    def mean(self, b0, e0, b1, e1):
+        """
+        Arguments
+        ---------
+        b0, e0 : int
+            Row range [b0, e0)
+        b1, e1 : int
+            Column range [b1, e1)
+
+        Returns
+        -------
+        float
+            Same with pdist[b0:e0, b1:e1].mean(). Ranges are truncated like slicing.
+            The block must lie in the band.
+        """
+        area = (min(e0, self.shape[0]) - b0) * (min(e1, self.shape[1]) - b1)
+        if area <= 0:
+            return np.nan
+        return self.sum(b0, e0, b1, e1) / area
+
+    def todense(self):
+        """
+        Returns
+        -------
+        numpy.ndarray
+            (n, n) matrix. Out of band values are nan. Only for debugging and visualization
+        """
+        n = self.shape[0]
+        W = self.bandwidth
+        dense = np.full((n, n), np.nan)
+        for i in range(n):
+            b, e = max(0, i - W), min(n, i + W + 1)
+            dense[i, b:e] = self.band[i, b-i+W:e-i+W]
+        return dense
+
+
+def _resize(array, n_rows):
+    resized = np.zeros((n_rows, array.shape[1]))
+    resized[:array.shape[0]] = array
+    return resized
+
+def find_rectangular_banded(x, threshold=0.4, min_length=2, max_length=20, transform=None):
+    """
+    Arguments
+    ---------
+    x : numpy.ndarray or scipy.sparse matrix
+        (n dates, dim) date vectors. Dense docvecs or sparse BOW
+    threshold : float
+        Minimum inner distance of segments
+    min_length : int
+        Minimum dates of a segment
+    max_length : int
+        Maximum dates of a segment
+    transform : callable or None
+        Elementwise function applied to cosine distance
+
+    Returns
+    -------
+    list of tuple
+        Each tuple is (begin index, end index, length).
+        Same with find_rectangular(pairwise_distances(x, metric='cosine'), ...)
+        without materializing (n, n) distance matrix.
+    """
+    band = BandedDistance(x, bandwidth=max_length, transform=transform)
+    return find_rectangular(band, threshold, min_length, max_length)
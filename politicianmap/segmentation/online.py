@@ -0,0 +1,90 @@
+import numpy as np
+import scipy.sparse as sp
+from .banded import BandedDistance
+from .segmentor import _scan_step
+
+
+class OnlineSegmentor:
+    """
+    Incremental version of find_rectangular for date vectors arriving day by day.
+    After each append, segments is same with
+    find_rectangular(pairwise_distances(all vectors, metric='cosine'), threshold, min_length, max_length)
+
+        >>> segmentor = OnlineSegmentor(threshold=0.5, min_length=5, max_length=20)
+        >>> segmentor.append(docvec[:1000])
+        >>> finalized, tentative = segmentor.append(docvec_of_today)
+
+    Segments which begin more than max_length dates before the last date never
+    change, and they are returned as finalized segments once. Tentative segments
+    are recomputed at every append and may change with following dates.
+
+    Arguments
+    ---------
+    threshold : float
+        Minimum inner distance of segments
+    min_length : int
+        Minimum dates of a segment
+    max_length : int
+        Maximum dates of a segment
+    transform : callable or None
+        Elementwise function applied to cosine distance
+    """
+
+    def __init__(self, threshold=0.4, min_length=2, max_length=20, transform=None):
+        self.threshold = threshold
+        self.min_length = min_length
+        self.max_length = max_length
+        self.transform = transform
+        self.band = None
+        self.finalized = []
+        self.tentative = []
+        self._b = 1
+
+    @property
+    def n_dates(self):
+        return 0 if self.band is None else self.band.shape[0]
+
+    @property
+    def segments(self):
+        return self.finalized + self.tentative
+
+    def append(self, x):
+        """
+        Argument
+        --------
+        x : numpy.ndarray or scipy.sparse matrix
+            (n new dates, dim) or (dim,) date vectors
+
+        Returns
+        -------
+        finalized : list of tuple
+            Newly finalized segments. Each tuple is (begin index, end index, length)
+        tentative : list of tuple
+            Segments after the last finalized one. They may be updated by following dates
+        """
+        if not sp.issparse(x) and np.asarray(x).ndim == 1:
+            x = np.asarray(x).reshape(1, -1)
+        if self.band is None:
+            self.band = BandedDistance(x, self.max_length, transform=self.transform)
+        else:
+            self.band.append(x)
+
+        n = self.n_dates
+        finalized = []
+        # decisions from b are fixed when b + max_length <= n
+        while self._b + self.max_length <= n:
+            segment, self._b = _scan_step(self.band, self._b, n,
+                self.threshold, self.min_length, self.max_length)
+            if segment is not None:
+                finalized.append(segment)
+        self.finalized += finalized
+
+        tentative = []
+        b = self._b
+        while b < n:
+            segment, b = _scan_step(self.band, b, n,
+                self.threshold, self.min_length, self.max_length)
+            if segment is not None:
+                tentative.append(segment)
+        self.tentative = tentative
+        return finalized, tentative
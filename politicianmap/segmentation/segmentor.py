@@ -1,23 +1,83 @@
 import numpy as np
 
 
+class SummedAreaTable:
+    """
+    Summed area table (2D prefix sum) of pairwise distance matrix.
+    Mean of any block pdist[b0:e0, b1:e1] is computed in O(1).
+
+        >>> sat = SummedAreaTable(pdist)
+        >>> sat.mean(b, e, b, e) # same with pdist[b:e,b:e].mean()
+        >>> segments = find_rectangular(sat, threshold=0.5, min_length=5)
+    """
+
+    def __init__(self, pdist):
+        self.pdist = pdist
+        self.shape = pdist.shape
+        n_rows, n_cols = pdist.shape
+        self.table = np.zeros((n_rows + 1, n_cols + 1))
+        self.table[1:,1:] = np.asarray(pdist, dtype=np.float64).cumsum(axis=0).cumsum(axis=1)
+        self._item = self.table.item
+
+    def __getitem__(self, index):
+        return self.pdist.item(index)
+
+    def sum(self, b0, e0, b1, e1):
+        e0 = min(e0, self.shape[0])
+        e1 = min(e1, self.shape[1])
+        t = self._item
+        return t(e0, e1) - t(b0, e1) - t(e0, b1) + t(b0, b1)
+
+    def mean(self, b0, e0, b1, e1):
+        """
+        Arguments
+        ---------
+        b0, e0 : int
+            Row range [b0, e0)
+        b1, e1 : int
+            Column range [b1, e1)
+
+        Returns
+        -------
+        float
+            Same with pdist[b0:e0, b1:e1].mean(). Ranges are truncated like slicing.
+        """
+        area = (min(e0, self.shape[0]) - b0) * (min(e1, self.shape[1]) - b1)
+        if area <= 0:
+            return np.nan
+        return self.sum(b0, e0, b1, e1) / area
+
+
+def as_block_table(pdist):
+    """
+    Returns pdist if it already supports O(1) block mean, else SummedAreaTable(pdist)
+    """
+    if isinstance(pdist, np.ndarray):
+        return SummedAreaTable(pdist)
+    return pdist
+
 def point_shift_distance(pdist, b, e, window=1):
-    return pdist[b:e, e:e+window].mean() -  pdist[b:e,b:e].mean()
+    if isinstance(pdist, np.ndarray):
+        return pdist[b:e, e:e+window].mean() -  pdist[b:e,b:e].mean()
+    return pdist.mean(b, e, e, e+window) - pdist.mean(b, e, b, e)
 
 def shift_distance(pdist, window=1):
     w = window
-    dist = np.zeros(pdist.shape[0])
+    table = as_block_table(pdist)
+    dist = np.zeros(table.shape[0])
     for e in range(w, dist.shape[0]-w):
         b = max(0, e - 3)
-        dist[b] = point_shift_distance(pdist, b, e, window)
+        dist[b] = point_shift_distance(table, b, e, window)
     return dist
 
 def find_rectangular(pdist, threshold=0.4, min_length=2, max_length=20):
     """
     Arguments
     ---------
-    pdist : numpy.ndarray
-        Pairwise distance matrix
+    pdist : numpy.ndarray or SummedAreaTable
+        Pairwise distance matrix.
+        It is converted to SummedAreaTable, so each block mean costs O(1).
+        To run several parameters on same data, give SummedAreaTable to avoid rebuilding it.
     threshold : float
         Minimum inner distance of segments
     min_length : int
@@ -30,29 +90,34 @@ def find_rectangular(pdist, threshold=0.4, min_length=2, max_length=20):
     list of tuple
         Each tuple is (begin index, end index, length)
     """
-    n = pdist.shape[0]
+    table = as_block_table(pdist)
+    n = table.shape[0]
     segments = []
     b = 1
     n_iter = 0
     exception_iter = n * max_length
     while b < n:
-        append = False
         n_iter += 1
         if n_iter > exception_iter:
             raise RuntimeError('Too much iteration. Fix bug.')
-        if pdist[b,b-1] > threshold:
-            b = b + 1
-            continue
-        for e in range(b+1, min(n, b+max_length)):
-            if point_shift_distance(pdist, b, e) < threshold:
-                continue
-            if (e - b < min_length) or (pdist[b:e,b:e].mean() > threshold):
-                b = b + 1
-                break
-            append = True
-            segments.append((b, e, e - b))
-            b = e
-            break
-        if not append:
-            b = b + 1
+        segment, b = _scan_step(table, b, n, threshold, min_length, max_length)
+        if segment is not None:
+            segments.append(segment)
     return segments
+
+def _scan_step(table, b, n, threshold, min_length, max_length):
+    """
+    One step of find_rectangular from begin index b.
+    It returns (segment or None, next begin index).
+    If b + max_length <= n, the result does not depend on data after the first n dates.
+    """
+    if table[b,b-1] > threshold:
+        return None, b + 1
+    for e in range(b+1, min(n, b+max_length)):
+        if point_shift_distance(table, b, e) < threshold:
+            continue
+        if (e - b < min_length) or (table.mean(b, e, b, e) > threshold):
+            # rejected candidate skips two begin indices like the original loop
+            return None, b + 2
+        return (b, e, e - b), e
+    return None, b + 1
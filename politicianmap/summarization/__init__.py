@@ -1,4 +1,6 @@
 from .keyword import extract_keywords
+from .keyword import extract_keywords_from_segments
+from .keyword import CumulativeTermCounter
 from .keysentence import select_keysentences
 from .keysentence import summarize
 from .keysentence import KeywordVectorizer
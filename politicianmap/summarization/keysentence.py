@@ -1,7 +1,8 @@
+from array import array
 import numpy as np
-from scipy.sparse import csr_matrix
-from sklearn.metrics import pairwise_distances
+from sklearn.preprocessing import normalize
 from politicianmap.utils import recover_rtokenized_sent
+from politicianmap.utils import to_csr_matrix
 
 
 def summarize(keywords, texts, topk=10, diversity=0.3, penalty=None):
@@ -70,19 +71,20 @@ def select_keysentences(x, keyvec, texts, initial_penalty, topk=10, diversity=0.
 
     diversity = diversity + 0.00001 # for truncation error
 
-    dist = pairwise_distances(x, keyvec, metric='cosine').reshape(-1)
-    dist = dist + initial_penalty
+    # cosine distance = 1 - inner product of L2 normalized vectors
+    x = normalize(x, norm='l2')
+    keyvec = normalize(np.asarray(keyvec, dtype=np.float64).reshape(1,-1), norm='l2')
+    dist = 1 - np.asarray(x.dot(keyvec.T)).reshape(-1)
+    dist = np.clip(dist, 0, 2) + initial_penalty
 
     idxs = []
     for _ in range(topk):
         idx = dist.argmin()
         idxs.append(idx)
         dist[idx] += 2 # maximum distance of cosine is 2
-        idx_all_distance = pairwise_distances(
-            x, x[idx].reshape(1,-1), metric='cosine').reshape(-1)
-        penalty = np.zeros(idx_all_distance.shape[0])
-        penalty[np.where(idx_all_distance <= diversity)[0]] = 2
-        dist += penalty
+        # a sparse matrix-vector product instead of pairwise_distances(x, x[idx])
+        sim = x.dot(x[idx].toarray().reshape(-1))
+        dist[np.where(1 - sim <= diversity)[0]] += 2
     return idxs
 
 
@@ -126,16 +128,15 @@ class KeywordVectorizer:
         scipy.sparse.csr_matrix
             (n sents, n keywords) shape Boolean matrix
         """
-        rows, cols, data = [], [], []
-        for i, sent in enumerate(sents):
+        indptr = array('q', [0])
+        indices = array('i')
+        for sent in sents:
             terms = set(self.tokenize(sent))
             for term in terms:
                 j = self.vocab_to_idx.get(term, -1)
                 if j == -1:
                     continue
-                rows.append(i)
-                cols.append(j)
-                data.append(1)
-        n_docs = len(sents)
+                indices.append(j)
+            indptr.append(len(indices))
         n_terms = len(self.idx_to_vocab)
-        return csr_matrix((data, (rows, cols)), shape=(n_docs, n_terms))
+        return to_csr_matrix(indptr, indices, array('i', [1]) * len(indices), n_terms)
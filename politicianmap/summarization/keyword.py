@@ -12,7 +12,7 @@ def proportion_ratio(pos, ref):
     ratio = np.nan_to_num(ratio)
     return ratio
 
-def extract_keywords(bow, doc_idx, idx_to_vocab, margin=1, ref_size=2, topk1=100, topk2=30, use_bothside=True):
+def extract_keywords(bow, doc_idx, idx_to_vocab, margin=1, ref_size=2, topk1=100, topk2=30, use_bothside=True, sparse=True):
     """
     Arguments
     ---------
@@ -34,6 +34,11 @@ def extract_keywords(bow, doc_idx, idx_to_vocab, margin=1, ref_size=2, topk1=100
     use_bothside : Boolean
         If True, use before and after dates as reference period.
         Else, use only before dates as reference period.
+    sparse : Boolean
+        If True, compute proportions and ratios only for terms which occur in
+        the target period and select candidates with partial sort.
+        It returns same keywords with dense computation.
+        Ties of term proportion or score are broken by term index.
 
     Returns
     -------
@@ -46,26 +51,230 @@ def extract_keywords(bow, doc_idx, idx_to_vocab, margin=1, ref_size=2, topk1=100
         >>> keywords = extract_keywords(docvec, doc_idx, idx_to_vocab, margin=5, ref_size=5)
     """
     n_docs = bow.shape[0]
-    # positive proportion
-    pos = to_proportion(bow, doc_idx)
 
-    # reference proportion
+    # reference period
     period_begin = min(doc_idx)
     period_end = max(doc_idx)
     period_len = len(doc_idx)
     ref_idx = [i for i in range(max(0, period_begin - margin - int(period_len * ref_size)), period_begin)]
     if use_bothside:
         ref_idx += [i for i in range(min(period_end + margin + int(period_len * ref_size), n_docs), n_docs)]
+
+    if sparse:
+        keywords = _extract_keywords_sparse(bow, doc_idx, ref_idx, topk1, topk2)
+        if keywords is not None:
+            return [(idx_to_vocab[idx], score, prop) for idx, score, prop in keywords]
+
+    # positive and reference proportion
+    pos = to_proportion(bow, doc_idx)
     ref = to_proportion(bow, ref_idx)
     ratio = proportion_ratio(pos, ref)
 
     # select candidates (frequent terms)
-    candidates_idx = pos.argsort()[-topk1:]
+    candidates_idx = top_argsort(pos, topk1)
     candidates_score = ratio[candidates_idx]
 
     # sort by distinctness
-    keyword_idx = candidates_idx[candidates_score.argsort()[-topk2:]]
+    keyword_idx = candidates_idx[candidates_score.argsort(kind='stable')[-topk2:]]
     keywords = [(idx, ratio[idx]) for idx in keyword_idx]
     keywords = [(idx_to_vocab[idx], score, pos[idx]) for idx, score in reversed(keywords)]
 
-    return keywords
\ No newline at end of file
+    return keywords
+
+def _extract_keywords_sparse(bow, doc_idx, ref_idx, topk1, topk2):
+    # term counts of target period only for occurred terms
+    sub = bow[doc_idx,:].tocsr()
+    if sub.nnz == 0:
+        return None
+    terms, inverse = np.unique(sub.indices, return_inverse=True)
+    counts = np.bincount(inverse, weights=sub.data)
+    total = counts.sum()
+    if total == 0:
+        return None
+    pos = counts / total
+
+    # reference proportion of the terms. Counts of reference period are
+    # also computed only for occurred terms, not as vocab-length vector
+    ref_sub = bow[ref_idx,:].tocsr()
+    ref_terms, ref_inverse = np.unique(ref_sub.indices, return_inverse=True)
+    ref_term_counts = np.bincount(ref_inverse, weights=ref_sub.data, minlength=ref_terms.shape[0])
+    ref_counts = np.zeros(terms.shape[0])
+    if ref_terms.shape[0] > 0:
+        k = np.minimum(np.searchsorted(ref_terms, terms), ref_terms.shape[0] - 1)
+        found = ref_terms[k] == terms
+        ref_counts[found] = ref_term_counts[k[found]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ref = ref_counts / ref_term_counts.sum()
+        ratio = np.nan_to_num(pos / (pos + ref))
+
+    # candidates. If less than topk1 terms occurred, the candidates include
+    # not-occurred terms of largest index like argsort of dense proportion
+    candidates = top_argsort(pos, topk1)
+    candidates_idx = terms[candidates]
+    candidates_score = ratio[candidates]
+    candidates_pos = pos[candidates]
+    n_zeros = min(topk1, bow.shape[1]) - candidates.shape[0]
+    if n_zeros > 0:
+        zeros = _largest_absent(terms, bow.shape[1], n_zeros)
+        candidates_idx = np.concatenate([zeros, candidates_idx])
+        candidates_score = np.concatenate([np.zeros(n_zeros), candidates_score])
+        candidates_pos = np.concatenate([np.zeros(n_zeros), candidates_pos])
+
+    # sort by distinctness
+    order = candidates_score.argsort(kind='stable')[-topk2:]
+    return [(candidates_idx[i], candidates_score[i], candidates_pos[i]) for i in reversed(order)]
+
+def _largest_absent(terms, n_terms, k):
+    # k largest indices in [0, n_terms) which are not in sorted terms, ascending order
+    present = set(terms.tolist())
+    absent = []
+    idx = n_terms - 1
+    while len(absent) < k and idx >= 0:
+        if idx not in present:
+            absent.append(idx)
+        idx -= 1
+    return np.asarray(absent[::-1], dtype=np.int64)
+
+def top_argsort(values, topk):
+    """
+    Arguments
+    ---------
+    values : numpy.ndarray
+        1D array
+    topk : int
+        Number of selected items
+
+    Returns
+    -------
+    numpy.ndarray
+        Same with values.argsort(kind='stable')[-topk:].
+        It uses partial selection (numpy.partition) and sorts only selected items.
+    """
+    n = values.shape[0]
+    if topk <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if topk >= n or np.isnan(values).any():
+        return values.argsort(kind='stable')[-topk:]
+    kth = np.partition(values, n - topk)[n - topk]
+    above = np.where(values > kth)[0]
+    ties = np.where(values == kth)[0]
+    ties = ties[ties.shape[0] - (topk - above.shape[0]):]
+    selected = np.concatenate([above, ties])
+    return selected[np.lexsort((selected, values[selected]))]
+
+class CumulativeTermCounter:
+    """
+    Cumulative term counts over date axis with checkpoints.
+    Term counts of any period [b, e) are computed as prefix(e) - prefix(b),
+    and a prefix is a stored checkpoint plus at most `checkpoint` rows.
+
+        >>> counter = CumulativeTermCounter(bow, checkpoint=64)
+        >>> counts = counter.count(1511, 1519) # term counts of rows [1511, 1519)
+
+    Arguments
+    ---------
+    bow : scipy.sparse.csr_matrix
+        (date, term) bag-of-words matrix
+    checkpoint : int
+        Interval of dense cumulative count rows.
+        Memory is (n_dates / checkpoint, n_terms) int64, or float64 if bow has float values.
+        Counts of integer bow are same with bow[b:e].sum(axis=0). Counts of float bow
+        (for example, tf-idf) may differ from it by rounding error of the subtraction
+    """
+
+    def __init__(self, bow, checkpoint=64):
+        self.bow = bow.tocsr()
+        self.checkpoint = checkpoint
+        n_rows, n_terms = self.bow.shape
+        n_checkpoints = n_rows // checkpoint + 1
+        self.dtype = np.result_type(self.bow.dtype, np.int64)
+        self.cumulative = np.zeros((n_checkpoints, n_terms), dtype=self.dtype)
+        for k in range(1, n_checkpoints):
+            b, e = (k - 1) * checkpoint, k * checkpoint
+            self.cumulative[k] = self.cumulative[k-1] + self._sum(b, e)
+
+    def _sum(self, b, e):
+        return np.asarray(self.bow[b:e].sum(axis=0), dtype=self.dtype).reshape(-1)
+
+    def prefix(self, i):
+        """Term counts of rows [0, i)"""
+        k = i // self.checkpoint
+        counts = self.cumulative[k]
+        if i > k * self.checkpoint:
+            counts = counts + self._sum(k * self.checkpoint, i)
+        return counts
+
+    def count(self, b, e):
+        """Term counts of rows [b, e)"""
+        if e <= b:
+            return np.zeros(self.bow.shape[1], dtype=self.dtype)
+        return self.prefix(e) - self.prefix(b)
+
+
+def extract_keywords_from_segments(bow, segments, idx_to_vocab, margin=1, ref_size=2,
+    topk1=100, topk2=30, use_bothside=True, counter=None, batch_size=64, max_batch_elements=2 ** 22):
+    """
+    Arguments
+    ---------
+    bow : scipy.sparse.csr_matrix
+        Bag-of-words model
+    segments : list of tuple
+        Each tuple is (begin index, end index, length). Output of find_rectangular
+    idx_to_vocab : list of str
+        Index to vocab
+    margin, ref_size, topk1, topk2, use_bothside :
+        Same with extract_keywords
+    counter : CumulativeTermCounter or None
+        If None, it is created from bow
+    batch_size : int
+        Number of segments processed in one vectorized step
+    max_batch_elements : int
+        Maximum number of elements of dense arrays of a batch. A segment uses
+        about 7 vocab-length rows (prefix counts and proportions), so batch_size is
+        reduced to max_batch_elements // (7 * n_terms) for large vocabulary.
+        Default is 32 MB of float64
+
+    Returns
+    -------
+    list of list of tuple
+        Keywords of each segment. Same with extract_keywords(bow, range(b, e), ...)
+
+    Usage
+    -----
+        >>> segments = find_rectangular(pdist, threshold=0.5, min_length=5)
+        >>> keywords = extract_keywords_from_segments(bow, segments, idx_to_vocab, margin=5, ref_size=5)
+    """
+    if counter is None:
+        counter = CumulativeTermCounter(bow)
+    n_docs = bow.shape[0]
+
+    # (positive period, reference periods) of each segment
+    periods = []
+    for segment in segments:
+        b, e = segment[0], segment[1]
+        period_len = e - b
+        ref = [(max(0, b - margin - int(period_len * ref_size)), b)]
+        if use_bothside:
+            ref.append((min(e - 1 + margin + int(period_len * ref_size), n_docs), n_docs))
+        periods.append(((b, e), ref))
+
+    # prefix rows (at most 4 per segment) and pos, ref, ratio rows of a batch
+    batch_size = max(1, min(batch_size, max_batch_elements // (7 * max(1, bow.shape[1]))))
+    keywords = []
+    for i in range(0, len(periods), batch_size):
+        batch = periods[i:i+batch_size]
+        boundaries = sorted({x for pos, ref in batch for period in [pos] + ref for x in period})
+        prefix = {x:counter.prefix(x) for x in boundaries}
+        pos = np.vstack([prefix[e] - prefix[b] for (b, e), _ in batch])
+        ref = np.vstack([sum(prefix[e] - prefix[b] for b, e in ref_) for _, ref_ in batch])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pos = pos / pos.sum(axis=1).reshape(-1,1)
+            ref = ref / ref.sum(axis=1).reshape(-1,1)
+            ratio = np.nan_to_num(pos / (pos + ref))
+
+        for j in range(len(batch)):
+            candidates_idx = top_argsort(pos[j], topk1)
+            candidates_score = ratio[j, candidates_idx]
+            keyword_idx = candidates_idx[candidates_score.argsort(kind='stable')[-topk2:]]
+            keywords.append([(idx_to_vocab[idx], ratio[j, idx], pos[j, idx]) for idx in reversed(keyword_idx)])
+    return keywords
@@ -1,30 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import math
-from .keyword import extract_keywords
-from .keysentence import summarize
+import multiprocessing
+import numpy as np
+import os
+import pickle
+from .keyword import extract_keywords_from_segments
+from .keysentence import KeywordVectorizer
+from .keysentence import select_keysentences
+from politicianmap.utils import recover_rtokenized_sent
 
 
 def summarize_timeline(news, idx_to_date, segments, docvec, idx_to_vocab, penalty, margin=10,
-    ref_size=5, use_bothside=False, diversity=0.6, num_candidates=300, num_keywords=60, num_keysents=5):
+    ref_size=5, use_bothside=False, diversity=0.6, num_candidates=300, num_keywords=60, num_keysents=5,
+    n_jobs=1, cache_dir=None, cache_key=''):
+    """
+    Arguments
+    ---------
+    news : News or PackedNews
+        It provides get_sents(begin_date, end_date)
+    idx_to_date : list of str
+        Date of each row of docvec
+    segments : list of tuple
+        Output of find_rectangular. Each tuple is (begin index, end index, length)
+    docvec : scipy.sparse.csr_matrix
+        (date, term) bag-of-words matrix
+    idx_to_vocab : list of str
+        Index to vocab
+    penalty : callable
+        Penalty function of key sentence. str -> float
+    n_jobs : int
+        Number of processes. Segments are summarized in a process pool.
+        docvec and news are shared with workers by fork (or sent once to each worker
+        if fork is not available), not pickled for each segment.
+    cache_dir : str or None
+        If not None, sentences of each segment and their keyword vectors
+        are cached in this directory. Sentences are cached by period, and keyword
+        vectors by period and keywords. Changing only diversity, num_keysents or penalty
+        reuses the cache and runs only key sentence selection, and the sentences
+        are reused also with other docvec.
+    cache_key : str
+        Identifier of news such as politician index. It is a part of cache key
+        with directory of news and segment period. It is required if news has
+        no directory (dirname of News or path of PackedNews) and cache_dir is given.
+
+    Returns
+    -------
+    timeline : list of tuple
+        Each tuple is (begin date, end date, keywords, key sentences)
+    """
+
+    global _timeline_args
+    params = {'margin': margin, 'ref_size': ref_size, 'use_bothside': use_bothside,
+        'diversity': diversity, 'num_candidates': num_candidates,
+        'num_keywords': num_keywords, 'num_keysents': num_keysents}
+    if cache_dir is not None:
+        source = getattr(news, 'dirname', None) or getattr(news, 'path', None)
+        if source is None and not cache_key:
+            raise ValueError('cache_key is required to cache sentences of news without directory')
+        cache_key = (cache_key, os.path.abspath(source) if source else '')
+        if not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+    # keywords of all segments from cumulative term counts
+    keywords = extract_keywords_from_segments(docvec, segments, idx_to_vocab,
+        margin=margin, ref_size=ref_size, use_bothside=use_bothside,
+        topk1=num_candidates, topk2=num_keywords)
+    tasks = [(segment, keywords_) for segment, keywords_ in zip(segments, keywords)]
+    args = (news, idx_to_date, docvec, idx_to_vocab, penalty, params, cache_dir, cache_key)
 
-    timeline = []
     n_segments = len(segments)
-    for i, (b, e, _) in enumerate(segments):
-        doc_idx = [i for i in range(b, e)]
-        keywords = extract_keywords(docvec, doc_idx, idx_to_vocab,
-            margin=margin, ref_size=ref_size, use_bothside=use_bothside,
-            topk1=num_candidates, topk2=num_keywords)
-        if not keywords:
-            continue
-        b_date, e_date = idx_to_date[b], idx_to_date[e-1]
-        docs = news.get_news(b_date, e_date)
-        sents = [sent for doc in docs for sent in doc.split('  ')]
-        vocab_score = {word:score for word, score, _ in keywords}
-        keysentences = summarize(vocab_score, sents, penalty=penalty, topk=num_keysents, diversity=diversity)
-        timeline.append((b_date, e_date, keywords, keysentences))
-        print('\rsummarizing {} / {} segments ...'.format(i, n_segments), end='')
+    try:
+        if n_jobs <= 1:
+            _initialize(args)
+            timeline = _collect(map(_summarize_a_segment, tasks), n_segments)
+        else:
+            with _create_executor(n_jobs, args) as executor:
+                results = executor.map(_summarize_a_segment, tasks, chunksize=max(1, n_segments // (4 * n_jobs)))
+                timeline = _collect(results, n_segments)
+    finally:
+        _timeline_args = None
     print('\rsummarizing {0} segments was done   '.format(n_segments))
     return timeline
 
+_timeline_args = None
+
+def _collect(results, n_segments):
+    timeline = []
+    for i, summary in enumerate(results):
+        if summary is not None:
+            timeline.append(summary)
+        print('\rsummarizing {} / {} segments ...'.format(i, n_segments), end='')
+    return timeline
+
+def _initialize(args):
+    global _timeline_args
+    _timeline_args = args
+
+def _create_executor(n_jobs, args):
+    try:
+        # workers inherit _timeline_args without pickling
+        _initialize(args)
+        return ProcessPoolExecutor(n_jobs, mp_context=multiprocessing.get_context('fork'))
+    except ValueError:
+        return ProcessPoolExecutor(n_jobs, initializer=_initialize, initargs=(args,))
+
+def _summarize_a_segment(task):
+    news, idx_to_date, docvec, idx_to_vocab, penalty, params, cache_dir, cache_key = _timeline_args
+    (b, e, _), keywords = task
+    if not keywords:
+        return None
+    b_date, e_date = idx_to_date[b], idx_to_date[e-1]
+
+    # sentences depend only on news and period, and keyword vectors depend also on keywords.
+    # Keyword order is a part of the key because columns of tied scores follow the order
+    vocab_score = {word:score for word, score, _ in keywords}
+    sents_key = (cache_key, b_date, e_date)
+    x_key = (sents_key, list(vocab_score.items()))
+    sents_path, x_path = None, None
+    if cache_dir is not None:
+        sents_path = _cache_path(cache_dir, 'sents', sents_key)
+        x_path = _cache_path(cache_dir, 'x', x_key)
+
+    sents = _load_cache(sents_path)
+    if sents is None:
+        sents = news.get_sents(b_date, e_date)
+        _save_cache(sents_path, sents)
+    x = _load_cache(x_path)
+    if x is None:
+        x = KeywordVectorizer(vocab_score).vectorize(sents)
+        _save_cache(x_path, x)
+
+    keysentences = _select_keysentences(keywords, sents, x, penalty,
+        params['num_keysents'], params['diversity'])
+    return (b_date, e_date, keywords, keysentences)
+
+def _cache_path(cache_dir, name, key):
+    return '{}/{}_{}.pkl'.format(cache_dir, name, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+
+def _load_cache(path):
+    if path is None or not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def _save_cache(path, obj):
+    if path is None:
+        return
+    # other workers may read the cache while it is written
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(tmp_path, path)
+
+def _select_keysentences(keywords, sents, x, penalty, topk, diversity):
+    # same with summarize(vocab_score, sents, topk, diversity, penalty) using vectorized x
+    if not 0 <= diversity <= 1:
+        raise ValueError('Diversity must be [0, 1] float value')
+    if x.nnz == 0:
+        return []
+    vocab_score = {word:score for word, score, _ in keywords}
+    keyvec = KeywordVectorizer(vocab_score).keyword_vector.reshape(1,-1)
+    if not callable(penalty):
+        penalty = lambda x: 0
+    initial_penalty = np.asarray([penalty(sent) for sent in sents])
+    idxs = select_keysentences(x, keyvec, sents, initial_penalty, topk, diversity)
+    return [recover_rtokenized_sent(sents[idx]) for idx in idxs]
+
 
 class PenaltyFunction:
     def __init__(self, min_len=15, max_len=25, including_terms=None, including_term_penalty=0.4):
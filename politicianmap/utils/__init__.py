@@ -1,15 +1,37 @@
 from .tokenizer import Stopwords
 from .tokenizer import Tokenizer
+from .tokenizer import FusedTokenizer
+from .tokenizer import HashedVocabulary
 from .tokenizer import Tagfilter
 from .tokenizer import DateDocsDecorator
 from .tokenizer import create_bow_date_merged
 from .tokenizer import create_bow
 from .tokenizer import scan_vocabulary
+from .tokenizer import scan_vocabulary_approximately
+from .tokenizer import count_terms
+from .tokenizer import merge_term_counts
+from .tokenizer import vocabulary_from_counts
+from .tokenizer import scan_vocabulary_and_create_bow
 from .tokenizer import recover_rtokenized_sent
+from .tokenizer import to_csr_matrix
 from .utils import News
 from .utils import check_dir
 from .utils import parse_date
 from .utils import line_counts
 from .utils import load_docs
+from .utils import build_manifest
+from .utils import load_manifest
+from .utils import line_offsets
+from .bow import save_bow
+from .bow import load_bow
+from .bow import bow_exists
+from .bow import convert_mtx
+from .bow import DailyBow
+from .bow import save_term_counts
+from .bow import load_term_counts
+from .corpus import pack_news
+from .corpus import PackedNews
+from .parallel import add_parallel_arguments
+from .parallel import run_tasks
 from .visualizer import draw_pairwise_distance
 from .visualizer import draw_line_plot
@@ -0,0 +1,271 @@
+from bisect import bisect_left
+from bisect import bisect_right
+import numpy as np
+import os
+from scipy.sparse import csr_matrix
+from .utils import check_dir
+
+
+def save_bow(path, bow, idx_to_vocab=None, idx_to_date=None):
+    """
+    Arguments
+    ---------
+    path : str
+        Path prefix of BOW store.
+        It creates {path}.indptr.npy, {path}.indices.npy, {path}.data.npy and {path}.shape.npy,
+        and {path}.vocab.txt, {path}.dates.txt if idx_to_vocab and idx_to_date are given.
+        If they are None, existing list files of the path are removed
+    bow : scipy.sparse matrix
+        (n rows, n vocabs) shape matrix
+    idx_to_vocab : list of str or None
+        Vocabulary list of columns
+    idx_to_date : list of str or None
+        Date list of rows
+
+    Usage
+    -----
+        >>> save_bow('bow/each_bow_0', bow, idx_to_vocab, idx_to_date)
+        >>> bow, idx_to_vocab, idx_to_date = load_bow('bow/each_bow_0')
+    """
+    check_dir(path)
+    bow = csr_matrix(bow)
+    bow.sort_indices()
+    np.save('{}.indptr.npy'.format(path), bow.indptr)
+    np.save('{}.indices.npy'.format(path), bow.indices)
+    np.save('{}.data.npy'.format(path), bow.data)
+    np.save('{}.shape.npy'.format(path), np.asarray(bow.shape, dtype=np.int64))
+    # remove list of previous BOW at same path, so load_bow does not return it
+    for name, items in [('vocab', idx_to_vocab), ('dates', idx_to_date)]:
+        list_path = '{}.{}.txt'.format(path, name)
+        if items is not None:
+            _write_list(list_path, items)
+        elif os.path.exists(list_path):
+            os.remove(list_path)
+
+def load_bow(path, mmap_mode='r'):
+    """
+    Arguments
+    ---------
+    path : str
+        Path prefix of BOW store created by save_bow
+    mmap_mode : str or None
+        Memory map mode of arrays. With 'r', loading does not read the arrays
+        and pages are read when they are accessed. None reads whole arrays into memory
+
+    Returns
+    -------
+    bow : scipy.sparse.csr_matrix
+        Read only if mmap_mode is 'r'. Use bow.copy() to modify it
+    idx_to_vocab : list of str or None
+        None if vocabulary was not saved
+    idx_to_date : list of str or None
+        None if dates were not saved
+    """
+    indptr = np.load('{}.indptr.npy'.format(path), mmap_mode=mmap_mode)
+    indices = np.load('{}.indices.npy'.format(path), mmap_mode=mmap_mode)
+    data = np.load('{}.data.npy'.format(path), mmap_mode=mmap_mode)
+    shape = tuple(int(v) for v in np.load('{}.shape.npy'.format(path)))
+    bow = csr_matrix((data, indices, indptr), shape=shape, copy=False)
+    # sorted by save_bow. It prevents scipy from sorting read only arrays
+    bow.has_sorted_indices = True
+    idx_to_vocab = _read_list('{}.vocab.txt'.format(path))
+    idx_to_date = _read_list('{}.dates.txt'.format(path))
+    return bow, idx_to_vocab, idx_to_date
+
+def bow_exists(path):
+    return all(os.path.exists('{}.{}.npy'.format(path, name))
+               for name in ['indptr', 'indices', 'data', 'shape'])
+
+def convert_mtx(mtx_path, path, idx_to_vocab=None, idx_to_date=None):
+    """
+    Convert Matrix Market file written by scipy.io.mmwrite into BOW store
+
+        >>> convert_mtx('bow/each_bow_0.mtx', 'bow/each_bow_0', idx_to_vocab, idx_to_date)
+    """
+    from scipy.io import mmread
+    bow = mmread(mtx_path).tocsr()
+    save_bow(path, bow, idx_to_vocab, idx_to_date)
+    return bow
+
+def save_term_counts(path, counter):
+    """
+    Write lines of 'term<TAB>count' sorted by count
+
+        >>> save_term_counts('term_counts/0.txt', count_terms(date_news, tokenizer))
+        >>> counter = load_term_counts('term_counts/0.txt')
+    """
+    check_dir(path)
+    with open(path, 'w', encoding='utf-8') as f:
+        for term, count in sorted(counter.items(), key=lambda x:(-x[1], x[0])):
+            f.write('{}\t{}\n'.format(term, count))
+
+def load_term_counts(path):
+    counter = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            term, count = line[:-1].split('\t')
+            counter[term] = int(count)
+    return counter
+
+def _write_list(path, items):
+    with open(path, 'w', encoding='utf-8') as f:
+        for item in items:
+            f.write('{}\n'.format(item))
+
+def _read_list(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return [line[:-1] for line in f]
+
+
+class DailyBow:
+    """
+    Append-only container of daily document-term matrices of a politician.
+    Documents of all dates are stored as rows of one CSR matrix in date order,
+    and a date range is a contiguous row range.
+
+        >>> daily = DailyBow('bow_daily/0/0_bow', n_cols=len(idx_to_vocab))
+        >>> for date, docs in date_news:
+        >>>     daily.append(date, create_bow(docs, tokenizer, vocab_to_idx))
+        >>> bow = daily.get('2018-01-01', '2018-01-31')
+        >>> bow, row_dates = daily.get('2018-01-01', '2018-01-31', return_dates=True)
+
+    Arguments
+    ---------
+    path : str
+        Path prefix of container
+    n_cols : int or None
+        Number of columns (vocabs). It is required when the container is created
+    overwrite : Boolean
+        If True, remove existing container and create new one
+
+    Files
+    -----
+    {path}.indptr : int64 row pointer. It begins with 0
+    {path}.indices : int32 column indices
+    {path}.data : int32 values
+    {path}.index : 'n_cols {n_cols}' header and lines of 'date<TAB>begin row<TAB>end row'
+    """
+
+    def __init__(self, path, n_cols=None, overwrite=False):
+        self.path = path
+        self.index_path = '{}.index'.format(path)
+        self.array_paths = {name:'{}.{}'.format(path, name) for name in ['indptr', 'indices', 'data']}
+        if overwrite:
+            for p in [self.index_path] + list(self.array_paths.values()):
+                if os.path.exists(p):
+                    os.remove(p)
+
+        self.dates = []
+        self.date_to_rows = {}
+        self.n_rows = 0
+        if os.path.exists(self.index_path):
+            self._load_index()
+            if n_cols is not None and n_cols != self.n_cols:
+                raise ValueError('n_cols of {} is {}, but {}'.format(path, self.n_cols, n_cols))
+        else:
+            if n_cols is None:
+                raise ValueError('n_cols is required to create {}'.format(path))
+            self.n_cols = n_cols
+            check_dir(path)
+            with open(self.index_path, 'w', encoding='utf-8') as f:
+                f.write('n_cols {}\n'.format(n_cols))
+            np.zeros(1, dtype=np.int64).tofile(self.array_paths['indptr'])
+            for name in ['indices', 'data']:
+                open(self.array_paths[name], 'wb').close()
+
+    def _load_index(self):
+        with open(self.index_path, encoding='utf-8') as f:
+            self.n_cols = int(next(f).split()[1])
+            for line in f:
+                cols = line.strip().split('\t')
+                if len(cols) != 3:
+                    continue
+                date, b, e = cols[0], int(cols[1]), int(cols[2])
+                self.dates.append(date)
+                self.date_to_rows[date] = (b, e)
+                self.n_rows = e
+        # remove rows written without index line (interrupted append)
+        nnz = int(self._array('indptr', np.int64)[self.n_rows])
+        for name, n_bytes in [('indptr', (self.n_rows + 1) * 8), ('indices', nnz * 4), ('data', nnz * 4)]:
+            if os.path.getsize(self.array_paths[name]) > n_bytes:
+                with open(self.array_paths[name], 'r+b') as f:
+                    f.truncate(n_bytes)
+
+    def __len__(self):
+        return len(self.dates)
+
+    def append(self, date, bow):
+        """
+        Arguments
+        ---------
+        date : str
+            yyyy-mm-dd format. It must be later than the last appended date
+        bow : scipy.sparse matrix
+            (n docs, n_cols) shape document-term matrix of the date
+        """
+        if self.dates and date <= self.dates[-1]:
+            raise ValueError('Date must be appended in order, but {} after {}'.format(date, self.dates[-1]))
+        bow = csr_matrix(bow)
+        if bow.shape[1] != self.n_cols:
+            raise ValueError('Number of columns must be {}, but {}'.format(self.n_cols, bow.shape[1]))
+        bow.sort_indices()
+        nnz = int(self._array('indptr', np.int64)[self.n_rows])
+        with open(self.array_paths['indptr'], 'ab') as f:
+            f.write((bow.indptr[1:].astype(np.int64) + nnz).tobytes())
+        with open(self.array_paths['indices'], 'ab') as f:
+            f.write(bow.indices.astype(np.int32).tobytes())
+        with open(self.array_paths['data'], 'ab') as f:
+            f.write(bow.data.astype(np.int32).tobytes())
+        b, e = self.n_rows, self.n_rows + bow.shape[0]
+        with open(self.index_path, 'a', encoding='utf-8') as f:
+            f.write('{}\t{}\t{}\n'.format(date, b, e))
+        self.dates.append(date)
+        self.date_to_rows[date] = (b, e)
+        self.n_rows = e
+
+    def get(self, begin_date=None, end_date=None, return_dates=False):
+        """
+        Arguments
+        ---------
+        begin_date : str or None
+            yyyy-mm-dd format. If None, use the first date
+        end_date : str or None
+            yyyy-mm-dd format. If None, use the last date
+        return_dates : Boolean
+            If True, return date of each row also
+
+        Returns
+        -------
+        bow : scipy.sparse.csr_matrix
+            (n docs, n_cols) shape document-term matrix of dates in [begin_date, end_date]
+        row_dates : list of str
+            Date of each row. Only when return_dates is True
+        """
+        b_date = bisect_left(self.dates, begin_date) if begin_date is not None else 0
+        e_date = bisect_right(self.dates, end_date) if end_date is not None else len(self.dates)
+        if b_date >= e_date:
+            bow = csr_matrix((0, self.n_cols), dtype=np.int32)
+            return (bow, []) if return_dates else bow
+
+        b = self.date_to_rows[self.dates[b_date]][0]
+        e = self.date_to_rows[self.dates[e_date - 1]][1]
+        indptr = np.array(self._array('indptr', np.int64)[b:e+1])
+        indices = self._array('indices', np.int32)[indptr[0]:indptr[-1]]
+        data = self._array('data', np.int32)[indptr[0]:indptr[-1]]
+        indptr -= indptr[0]
+        bow = csr_matrix((np.array(data), np.array(indices), indptr), shape=(e - b, self.n_cols))
+        if not return_dates:
+            return bow
+        row_dates = []
+        for date in self.dates[b_date:e_date]:
+            row_b, row_e = self.date_to_rows[date]
+            row_dates += [date] * (row_e - row_b)
+        return bow, row_dates
+
+    def _array(self, name, dtype):
+        path = self.array_paths[name]
+        if os.path.getsize(path) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r')
@@ -0,0 +1,185 @@
+from bisect import bisect_left
+from bisect import bisect_right
+import mmap
+import numpy as np
+from .utils import check_dir
+
+
+def pack_news(news, path):
+    """
+    Arguments
+    ---------
+    news : News
+        News instance to be packed
+    path : str
+        Path prefix of packed corpus.
+        It creates {path}.blob, {path}.offsets.npy, {path}.dateptr.npy and {path}.dates.txt
+
+    Usage
+    -----
+        >>> news = News('../data/politician/0/')
+        >>> pack_news(news, '../data/packed/0')
+        >>> packed = PackedNews('../data/packed/0')
+
+    {path}.blob is UTF-8 encoded docs, one doc per line, ordered by date.
+    {path}.offsets.npy is (n docs + 1,) shape byte offsets of docs in blob, and
+    {path}.dateptr.npy is (n dates + 1,) shape doc offsets of dates.
+    """
+    check_dir(path)
+    dates = []
+    date_ptr = [0]
+    offsets = [0]
+    with open('{}.blob'.format(path), 'wb') as f:
+        for date in news.dates:
+            for doc in news.iter_news(date, date):
+                line = (doc + '\n').encode('utf-8')
+                f.write(line)
+                offsets.append(offsets[-1] + len(line))
+            dates.append(date)
+            date_ptr.append(len(offsets) - 1)
+    np.save('{}.offsets.npy'.format(path), np.asarray(offsets, dtype=np.int64))
+    np.save('{}.dateptr.npy'.format(path), np.asarray(date_ptr, dtype=np.int64))
+    with open('{}.dates.txt'.format(path), 'w', encoding='utf-8') as f:
+        for date in dates:
+            f.write('{}\n'.format(date))
+    print('packed {} dates, {} docs to {}'.format(len(dates), len(offsets) - 1, path))
+
+
+class PackedNews:
+    """
+    Memory-mapped version of News created by pack_news.
+    It has same interface with News (dates, date_to_ndocs, n_docs, get_news, iter_news)
+    but it does not re-read text files; a date range is a contiguous slice of blob.
+
+        >>> packed = PackedNews('../data/packed/0')
+        >>> for i, doc in enumerate(packed.get_news(begin_date = '2018-01-01', end_date='2018-01-03')):
+        >>>     print(doc[:200], end='\\n\\n')
+        >>> sents = packed.get_sents('2018-01-01', '2018-01-03')
+    """
+
+    def __init__(self, path, begin_date=None, end_date=None):
+        self.path = path
+        with open('{}.dates.txt'.format(path), encoding='utf-8') as f:
+            self._dates = [date.strip() for date in f]
+        self._offsets = np.load('{}.offsets.npy'.format(path), mmap_mode='r')
+        self._date_ptr = np.load('{}.dateptr.npy'.format(path), mmap_mode='r')
+        with open('{}.blob'.format(path), 'rb') as f:
+            if self._offsets[-1] > 0:
+                self._blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._blob = b''
+
+        if begin_date is None:
+            begin_date = self._dates[0]
+        if end_date is None:
+            end_date = self._dates[-1]
+        self._b = bisect_left(self._dates, begin_date)
+        self._e = bisect_right(self._dates, end_date)
+        self.dates = self._dates[self._b:self._e]
+        self.date_to_ndocs = [(self._dates[i], int(self._date_ptr[i+1] - self._date_ptr[i]))
+            for i in range(self._b, self._e)]
+        self.n_docs = sum(c for _, c in self.date_to_ndocs)
+        print('{} has news of {} dates, {} docs'.format(
+            path, len(self.dates), self.n_docs))
+
+    def __iter__(self):
+        for doc in self.iter_news():
+            if doc:
+                yield doc
+
+    def __len__(self):
+        return self.n_docs
+
+    def get_news(self, begin_date=None, end_date=None):
+        """
+        Arguments
+        ---------
+        begin_date : str
+            yyyy-mm-dd format
+            If it is None, use first date of packed news
+            Default is None
+        end_date : str
+            yyyy-mm-dd format
+            If it is None, use last date of packed news
+            Default is None
+
+        Returns
+        ------
+        list of str
+            A str is a doublespace line format document of a news
+        """
+        b, e = self._doc_range(begin_date, end_date)
+        if b == e:
+            return []
+        text = self._blob[self._offsets[b]:self._offsets[e]-1].decode('utf-8')
+        return text.split('\n')
+
+    def iter_news(self, begin_date=None, end_date=None):
+        """
+        Arguments
+        ---------
+        begin_date : str
+            yyyy-mm-dd format
+            If it is None, use first date of packed news
+            Default is None
+        end_date : str
+            yyyy-mm-dd format
+            If it is None, use last date of packed news
+            Default is None
+
+        Yields
+        ------
+        doc : str
+            Doublespace line format document of a news
+        """
+        begin_date, end_date = self._set_date(begin_date, end_date)
+        b = max(self._b, bisect_left(self._dates, begin_date))
+        e = min(self._e, bisect_right(self._dates, end_date))
+        for i in range(b, e):
+            for doc in self.get_news(self._dates[i], self._dates[i]):
+                yield doc
+
+    def get_sents(self, begin_date=None, end_date=None):
+        """
+        Arguments
+        ---------
+        begin_date : str
+            yyyy-mm-dd format
+        end_date : str
+            yyyy-mm-dd format
+
+        Returns
+        -------
+        list of str
+            Sentences of docs in the period. A doc is split with double space.
+        """
+        return [sent for doc in self.get_news(begin_date, end_date) for sent in doc.split('  ')]
+
+    def get_doc(self, i):
+        """
+        Argument
+        --------
+        i : int
+            Global doc index in packed corpus
+
+        Returns
+        -------
+        memoryview
+            UTF-8 encoded bytes of the doc without copy
+        """
+        return memoryview(self._blob)[self._offsets[i]:self._offsets[i+1]-1]
+
+    def _set_date(self, begin_date, end_date):
+        if begin_date is None:
+            begin_date = self.dates[0]
+        if end_date is None:
+            end_date = self.dates[-1]
+        return begin_date, end_date
+
+    def _doc_range(self, begin_date, end_date):
+        begin_date, end_date = self._set_date(begin_date, end_date)
+        b = max(self._b, bisect_left(self._dates, begin_date))
+        e = min(self._e, bisect_right(self._dates, end_date))
+        if b >= e:
+            return 0, 0
+        return int(self._date_ptr[b]), int(self._date_ptr[e])
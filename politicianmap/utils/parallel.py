@@ -0,0 +1,120 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
+import os
+import time
+import traceback
+
+
+def add_parallel_arguments(parser):
+    """
+    Add --workers and --rerun options to argparse.ArgumentParser
+
+    Usage
+    -----
+        >>> parser = argparse.ArgumentParser()
+        >>> add_parallel_arguments(parser)
+        >>> args = parser.parse_args()
+        >>> run_tasks(func, tasks, workers=args.workers, marker_dir=marker_dir, rerun=args.rerun)
+    """
+    parser.add_argument('--workers', type=int, default=1,
+        help='Number of processes. Each task (politician) runs in a process')
+    parser.add_argument('--rerun', dest='rerun', action='store_true',
+        help='Ignore completion markers and run all tasks again')
+    return parser
+
+def run_tasks(func, tasks, workers=1, marker_dir=None, rerun=False, name='task', callback=None):
+    """
+    Arguments
+    ---------
+    func : callable
+        Top level (picklable) function. It is called as func(*args)
+    tasks : list of tuple
+        Each tuple is (key, args). key is used for progress message and completion marker
+    workers : int
+        Number of processes. If it is 1, tasks run in current process
+    marker_dir : str or None
+        If not None, {marker_dir}/{name}_{key}.done is created after a task succeeded
+        and the task is skipped next time.
+    rerun : Boolean
+        If True, ignore existing completion markers
+    name : str
+        Name of job. It is used for progress message and marker file name
+    callback : callable or None
+        If not None, callback(key, result) is called in current process
+        with the return value of func for each succeeded task
+
+    Returns
+    -------
+    failed : list of tuple
+        Each tuple is (key, traceback str). A failed task does not stop other tasks.
+
+    Usage
+    -----
+        >>> tasks = [(idx, (data_dir, idx, dest_dir, debug)) for idx in politician]
+        >>> failed = run_tasks(normalize_a_politician, tasks, workers=4, marker_dir=dest_dir+'/.done')
+    """
+    todo = []
+    for key, args in tasks:
+        if not rerun and _is_done(marker_dir, name, key):
+            print('[{}] skip {} (already done)'.format(name, key))
+            continue
+        todo.append((key, args))
+
+    n_tasks = len(todo)
+    failed = []
+    begin_time = time.time()
+
+    def report(i, key, result, error):
+        elapsed = time.time() - begin_time
+        if error is None:
+            if callback is not None:
+                callback(key, result)
+            _mark_done(marker_dir, name, key)
+            print('[{}] {} / {} done: {} ({:.1f} sec)'.format(name, i, n_tasks, key, elapsed))
+        else:
+            failed.append((key, error))
+            print('[{}] {} / {} failed: {} ({:.1f} sec)\n{}'.format(name, i, n_tasks, key, elapsed, error))
+
+    if workers <= 1:
+        for i, (key, args) in enumerate(todo):
+            result, error = _run_task(func, key, args)
+            report(i + 1, key, result, error)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_run_task, func, key, args):key for key, args in todo}
+            for i, future in enumerate(as_completed(futures)):
+                key = futures[future]
+                try:
+                    result, error = future.result()
+                except Exception:
+                    # worker process was killed (e.g. out of memory)
+                    result, error = None, traceback.format_exc()
+                report(i + 1, key, result, error)
+
+    if failed:
+        print('[{}] {} tasks failed: {}'.format(name, len(failed), [key for key, _ in failed]))
+    else:
+        print('[{}] all {} tasks were done'.format(name, n_tasks))
+    return failed
+
+def _run_task(func, key, args):
+    try:
+        return func(*args), None
+    except Exception:
+        return None, traceback.format_exc()
+
+def _marker_path(marker_dir, name, key):
+    return '{}/{}_{}.done'.format(marker_dir, name, key)
+
+def _is_done(marker_dir, name, key):
+    if marker_dir is None:
+        return False
+    return os.path.exists(_marker_path(marker_dir, name, key))
+
+def _mark_done(marker_dir, name, key):
+    if marker_dir is None:
+        return
+    if not os.path.exists(marker_dir):
+        os.makedirs(marker_dir, exist_ok=True)
+    with open(_marker_path(marker_dir, name, key), 'w', encoding='utf-8') as f:
+        f.write('{}\n'.format(time.strftime('%Y-%m-%d %H:%M:%S')))
@@ -1,5 +1,10 @@
+from array import array
 from collections import Counter
+from collections import OrderedDict
 from collections import defaultdict
+import numpy as np
+import re
+import zlib
 from scipy.sparse import csr_matrix
 
 
@@ -36,6 +41,107 @@ class Tokenizer:
             words = f(words)
         return words
 
+    def compile(self, cache_size=0):
+        """
+        Argument
+        --------
+        cache_size : int
+            Number of documents whose tokens are cached. 0 means no cache
+
+        Returns
+        -------
+        FusedTokenizer or Tokenizer
+            If all filters are Stopwords or Tagfilter, returns FusedTokenizer
+            which has same output. Otherwise returns self
+
+        Usage
+        -----
+            >>> tokenizer = Tokenizer(Stopwords({'이런'}), Tagfilter('/R')).compile()
+        """
+        stopwords, tags = set(), set()
+        for f in self.filters:
+            if isinstance(f, Stopwords):
+                stopwords.update(f.stopwords)
+            elif isinstance(f, Tagfilter):
+                tags.update(f.tags)
+            else:
+                return self
+        return FusedTokenizer(stopwords, tags, cache_size)
+
+
+class FusedTokenizer:
+    """
+    Tokenizer with Stopwords and Tagfilter checked in one pass.
+    A word is removed when it is in stopwords or it contains one of tags.
+    Every tag begins with '/', so tag pattern is searched only in words having '/'
+
+        >>> tokenizer = FusedTokenizer(stopwords={'이런'}, tags={'/R'}, cache_size=10000)
+        >>> tokenizer.tokenize('이번 문장 은/R 이런 예시 이다/R')
+
+        $ ['이번', '문장', '예시']
+
+    Arguments
+    ---------
+    stopwords : set of str or None
+        Words to be removed
+    tags : set of str or None
+        Words containing one of tags are removed. Same with Tagfilter
+    cache_size : int
+        If it is positive, tokens of the most recently used cache_size documents are cached.
+        News repeat same documents (e.g. same article of different press) and this saves re-tokenizing
+    """
+
+    def __init__(self, stopwords=None, tags=None, cache_size=0):
+        self.stopwords = frozenset(stopwords if stopwords else [])
+        self.tags = {t if t[0] == '/' else '/'+t for t in tags} if tags else set()
+        if self.tags:
+            # longer tag first is not necessary because only existence is checked
+            self._tag_pattern = re.compile('|'.join(re.escape(t) for t in sorted(self.tags)))
+        else:
+            self._tag_pattern = None
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self.n_hits = 0
+        self.n_calls = 0
+
+    def __call__(self, doc):
+        return self.tokenize(doc)
+
+    def tokenize(self, doc):
+        """
+        Argument
+        --------
+        doc : str
+            A document
+
+        Returns
+        -------
+        list of str
+            Same with Tokenizer(Stopwords(stopwords), Tagfilter(tags)).tokenize(doc)
+        """
+        if self.cache_size <= 0:
+            return self._tokenize(doc)
+
+        self.n_calls += 1
+        cache = self._cache
+        words = cache.get(doc)
+        if words is not None:
+            self.n_hits += 1
+            cache.move_to_end(doc)
+            return list(words)
+        words = self._tokenize(doc)
+        cache[doc] = tuple(words)
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+        return words
+
+    def _tokenize(self, doc):
+        stopwords = self.stopwords
+        if self._tag_pattern is None:
+            return [w for w in doc.split() if not (w in stopwords)]
+        has_tag = self._tag_pattern.search
+        return [w for w in doc.split() if not (w in stopwords or ('/' in w and has_tag(w)))]
+
 
 class Stopwords:
     """
@@ -91,6 +197,188 @@ class DateDocsDecorator:
             yield (date, docs)
 
 
+class HashedVocabulary:
+    """
+    Vocabulary index of fixed number of columns by feature hashing.
+    It can be used as vocab_to_idx of create_bow and create_bow_date_merged
+    without scan_vocabulary, so BOW is built in one pass. Matrices of different
+    politicians built with same n_features have same columns.
+
+        >>> vocab_to_idx = HashedVocabulary(n_features=2 ** 20)
+        >>> bow, idx_to_date = create_bow_date_merged(date_news, tokenizer, vocab_to_idx)
+        >>> vocab_to_idx.decode(bow.indices[0])
+
+        $ ['문재인']
+
+    Hashed columns are not reversible, so terms are kept in a side table of
+    bounded size. It counts term frequency like space-saving algorithm.
+    create_bow and create_bow_date_merged add the frequency of term in each document (date)
+    with add(term, count), and get(term) adds 1. Each term has count and error,
+    and its true count is in [count - error, count]. When the table has more than
+    table_size terms, it keeps table_size / 2 terms of largest count - error.
+    A term added after removal of other terms begins with count = floor + 1 and
+    error = floor, where floor is the largest count of removed terms.
+
+    The table must be larger than n_frequent to find frequent terms of long tail
+    distribution. With 2M tokens of Zipf(1.1) and n_frequent=1000, frequent_terms(1000)
+    has 992 of the true top 1000 terms with table_size = 8 * n_frequent,
+    and 728 with table_size = 2 * n_frequent.
+
+    Arguments
+    ---------
+    n_features : int
+        Number of columns
+    n_frequent : int
+        Number of frequent terms returned by frequent_terms and used by decode
+    table_size : int or None
+        Maximum number of terms in the side table. If None, 8 * n_frequent
+    """
+
+    def __init__(self, n_features=2 ** 20, n_frequent=100000, table_size=None):
+        if table_size is None:
+            table_size = 8 * n_frequent
+        self.n_features = n_features
+        self.n_frequent = n_frequent
+        self.table_size = table_size
+        self.counter = {}
+        # overestimated count of terms added after removal. Others have no error
+        self.errors = {}
+        # largest count of removed terms. A new term may have appeared that many times before
+        self._floor = 0
+        self._column_to_terms = None
+
+    def __len__(self):
+        return self.n_features
+
+    def hash(self, term):
+        # stable across processes unlike hash(str)
+        return zlib.crc32(term.encode('utf-8')) % self.n_features
+
+    def get(self, term, default=-1):
+        return self.add(term, 1)
+
+    def add(self, term, count=1):
+        """
+        Add count of term to side table and return its column
+        """
+        counter = self.counter
+        prev = counter.get(term)
+        if prev is None:
+            counter[term] = self._floor + count
+            if self._floor > 0:
+                self.errors[term] = self._floor
+            if len(counter) > self.table_size:
+                self._prune()
+        else:
+            counter[term] = prev + count
+        self._column_to_terms = None
+        return self.hash(term)
+
+    def __getitem__(self, term):
+        return self.get(term)
+
+    def _ranked(self):
+        # sorted by guaranteed count (count - error), then by count and term
+        errors = self.errors
+        return sorted(self.counter.items(),
+            key=lambda x:(-(x[1] - errors.get(x[0], 0)), -x[1], x[0]))
+
+    def _prune(self):
+        ranked = self._ranked()
+        n_keep = self.table_size // 2
+        removed = ranked[n_keep:]
+        if removed:
+            self._floor = max(self._floor, max(count for _, count in removed))
+        self.counter = dict(ranked[:n_keep])
+        self.errors = {term:error for term, error in self.errors.items() if term in self.counter}
+
+    def merge(self, other):
+        """
+        Merge side table of other HashedVocabulary which has same n_features.
+        For example, merge vocabularies used in worker processes.
+        A term absent in one table may have appeared floor times in it,
+        so the floor is added to its count and error.
+        """
+        if other.n_features != self.n_features:
+            raise ValueError('n_features are different: {} and {}'.format(self.n_features, other.n_features))
+        counter, errors = {}, {}
+        for term in set(self.counter) | set(other.counter):
+            count, error = 0, 0
+            for vocab in [self, other]:
+                if term in vocab.counter:
+                    count += vocab.counter[term]
+                    error += vocab.errors.get(term, 0)
+                else:
+                    count += vocab._floor
+                    error += vocab._floor
+            counter[term] = count
+            if error > 0:
+                errors[term] = error
+        self.counter = counter
+        self.errors = errors
+        self._floor += other._floor
+        self._column_to_terms = None
+        if len(self.counter) > self.table_size:
+            self._prune()
+        return self
+
+    def frequent_terms(self, topk=None):
+        """
+        Returns
+        -------
+        list of tuple
+            (term, column, count) sorted by count.
+            count is guaranteed count (count - error) of term
+        """
+        if topk is None:
+            topk = self.n_frequent
+        errors = self.errors
+        return [(term, self.hash(term), count - errors.get(term, 0))
+                for term, count in self._ranked()[:topk]]
+
+    def decode(self, column):
+        """
+        Returns
+        -------
+        list of str
+            Frequent terms hashed into the column. Empty if there is no such term
+        """
+        if self._column_to_terms is None:
+            column_to_terms = {}
+            for term, column_, _ in self.frequent_terms():
+                column_to_terms.setdefault(column_, []).append(term)
+            self._column_to_terms = column_to_terms
+        return list(self._column_to_terms.get(column, []))
+
+    def save(self, path):
+        """
+        Write 'n_features n_frequent floor table_size' header and
+        lines of 'term<TAB>column<TAB>count<TAB>error'
+        """
+        errors = self.errors
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{} {} {} {}\n'.format(self.n_features, self.n_frequent, self._floor, self.table_size))
+            for term, count in self._ranked():
+                f.write('{}\t{}\t{}\t{}\n'.format(term, self.hash(term), count, errors.get(term, 0)))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            header = [int(v) for v in next(f).split()]
+            n_features, n_frequent, floor = header[:3]
+            table_size = header[3] if len(header) > 3 else None
+            vocab = cls(n_features, n_frequent, table_size)
+            vocab._floor = floor
+            for line in f:
+                cols = line[:-1].split('\t')
+                vocab.counter[cols[0]] = int(cols[2])
+                # files without error column were written before errors were kept
+                error = int(cols[3]) if len(cols) > 3 else 0
+                if error > 0:
+                    vocab.errors[cols[0]] = error
+        return vocab
+
+
 def scan_vocabulary(date_docs, tokenizer, min_count=20):
     """
     Arguments
@@ -114,16 +402,159 @@ def scan_vocabulary(date_docs, tokenizer, min_count=20):
         >>> date_news = DateDocsDecorator(news, min_doc=10)
         >>> idx_to_vocab, vocab_to_idx = scan_vocabulary(date_news, tokenizer, min_count=5)
     """
+    return vocabulary_from_counts(count_terms(date_docs, tokenizer), min_count)
+
+def count_terms(date_docs, tokenizer):
+    """
+    Arguments
+    ---------
+    date_docs : Any type iterable data that yield (date, [doc])
+    tokenizer : callable
+        tokenizer(doc) : list of str
+
+    Returns
+    -------
+    counter : {str:int}
+        Frequency of all terms
+    """
     counter = defaultdict(int)
     for date, docs in date_docs:
         for doc in docs:
             for word in tokenizer(doc):
                 counter[word] += 1
+    return dict(counter)
+
+def merge_term_counts(counters):
+    """
+    Arguments
+    ---------
+    counters : Any type iterable data that yield {str:int}
+        For example, term counts of politicians
+
+    Returns
+    -------
+    counter : {str:int}
+        Sum of counters. Its cost is O(number of terms), not O(corpus)
+    """
+    merged = defaultdict(int)
+    for counter in counters:
+        for term, count in counter.items():
+            merged[term] += count
+    return dict(merged)
+
+def vocabulary_from_counts(counter, min_count=20):
+    """
+    Arguments
+    ---------
+    counter : {str:int}
+        Term frequency such as output of count_terms or merge_term_counts
+    min_count : int
+        Minimum frequency of vocabulary
+
+    Returns
+    -------
+    idx_to_vocab, vocab_to_idx
+        Same with scan_vocabulary on the corpus of counter
+
+    Usage
+    -----
+        >>> counters = [count_terms(DateDocsDecorator(news, min_doc=10), tokenizer) for news in news_list]
+        >>> idx_to_vocab, vocab_to_idx = vocabulary_from_counts(merge_term_counts(counters), min_count=20)
+    """
     counter = {term:count for term, count in counter.items() if count >= min_count}
     idx_to_vocab = [vocab for vocab in sorted(counter, key=lambda x:(-counter[x], x))]
     vocab_to_idx = {vocab:idx for idx, vocab in enumerate(idx_to_vocab)}
     return idx_to_vocab, vocab_to_idx
 
+def scan_vocabulary_approximately(date_docs, tokenizer, min_count=20,
+    width=2 ** 22, depth=4, return_uncertain=False, verbose=True):
+    """
+    Bounded memory version of scan_vocabulary. Term counts are approximated with
+    count-min sketch of (depth, width) shape and only terms whose estimated count
+    reaches min_count are kept as candidates. Memory is O(depth * width + vocabulary size)
+    instead of O(number of distinct terms).
+
+    Arguments
+    ---------
+    date_docs : Any type iterable data that yield (date, [doc])
+    tokenizer : callable
+        tokenizer(doc) : list of str
+    min_count : int
+        Minimum frequency of vocabulary
+    width : int
+        Number of counters in a row of sketch
+    depth : int
+        Number of rows of sketch
+    return_uncertain : Boolean
+        If True, return terms which may be misclassified also
+    verbose : Boolean
+        If True, print number of uncertain terms
+
+    Returns
+    -------
+    idx_to_vocab : list of str
+        Each str stands for word. Sorted by (estimated count, word)
+    vocab_to_idx : {str:int}
+        Vocabulary index map
+    uncertain : list of tuple
+        (term, estimated count). Only when return_uncertain is True.
+
+    Estimated count is never smaller than true count (conservative update), so all terms
+    of scan_vocabulary are included. With probability 1 - exp(-depth), overestimation is
+    smaller than e / width * (number of tokens), and terms in vocabulary whose
+    estimated count minus the bound is smaller than min_count are uncertain;
+    their true count may be smaller than min_count.
+
+    Usage
+    -----
+        >>> tokenizer = Tokenizer(Tagfilter({'/R'}))
+        >>> date_news = DateDocsDecorator(news, min_doc=10)
+        >>> idx_to_vocab, vocab_to_idx = scan_vocabulary_approximately(date_news, tokenizer, min_count=5)
+    """
+    sketch = np.zeros((depth, width), dtype=np.int64)
+    rows = np.arange(depth, dtype=np.uint64).reshape(-1, 1)
+    candidates = set()
+    n_tokens = 0
+
+    def positions(terms):
+        # double hashing: h1 + r * h2 for row r
+        h1 = np.fromiter((zlib.crc32(t.encode('utf-8')) for t in terms), dtype=np.uint64, count=len(terms))
+        h2 = np.fromiter((zlib.crc32(t.encode('utf-8'), 0x9e3779b9) | 1 for t in terms), dtype=np.uint64, count=len(terms))
+        return ((h1 + rows * h2) % np.uint64(width)).astype(np.int64)
+
+    def estimate(pos):
+        return sketch[np.arange(depth).reshape(-1, 1), pos].min(axis=0)
+
+    for date, docs in date_docs:
+        # count terms of a date exactly, and add them to sketch at once
+        tf = Counter(word for doc in docs for word in tokenizer(doc))
+        if not tf:
+            continue
+        terms = list(tf)
+        counts = np.fromiter(tf.values(), dtype=np.int64, count=len(terms))
+        n_tokens += int(counts.sum())
+        pos = positions(terms)
+        updated = estimate(pos) + counts
+        # conservative update
+        for r in range(depth):
+            np.maximum.at(sketch[r], pos[r], updated)
+        candidates.update(t for t, c in zip(terms, updated) if c >= min_count)
+
+    terms = list(candidates)
+    counts = estimate(positions(terms)) if terms else np.zeros(0, dtype=np.int64)
+    counter = {t:int(c) for t, c in zip(terms, counts) if c >= min_count}
+    idx_to_vocab = [vocab for vocab in sorted(counter, key=lambda x:(-counter[x], x))]
+    vocab_to_idx = {vocab:idx for idx, vocab in enumerate(idx_to_vocab)}
+
+    bound = np.e / width * n_tokens
+    uncertain = [(t, counter[t]) for t in idx_to_vocab if counter[t] - bound < min_count]
+    if verbose:
+        print('scanned {} tokens, {} vocabs. error bound = {:.2f}, {} terms near min_count may be misclassified'.format(
+            n_tokens, len(idx_to_vocab), bound, len(uncertain)))
+    if return_uncertain:
+        return idx_to_vocab, vocab_to_idx, uncertain
+    return idx_to_vocab, vocab_to_idx
+
 def create_bow_date_merged(date_docs, tokenizer, vocab_to_idx):
     """
     Arguments
@@ -137,7 +568,7 @@ def create_bow_date_merged(date_docs, tokenizer, vocab_to_idx):
     Returns
     -------
     bow : scipy.sparse.csr_matrix
-        (date, term) frequency matrix
+        (date, term) frequency matrix. dtype of values is int32
     idx_to_date : list of str
         Each str stands for date
 
@@ -149,28 +580,99 @@ def create_bow_date_merged(date_docs, tokenizer, vocab_to_idx):
         >>> bow, idx_to_date = create_bow_date_merged(date_news, tokenizer, vocab_to_idx)
     """
     idx_to_date = []
-    rows, cols, data = [], [], []
+    indptr = array('q', [0])
+    indices = array('i')
+    data = array('i')
+    # side table of HashedVocabulary counts term frequency
+    hashed = isinstance(vocab_to_idx, HashedVocabulary)
     for date, docs in date_docs:
-        # indexing row
-        i = len(idx_to_date)
         idx_to_date.append(date)
 
         # count term frequency
         tf = Counter(word for doc in docs for word in tokenizer(doc))
         for term, count in tf.items():
-            j = vocab_to_idx.get(term, -1)
+            j = vocab_to_idx.add(term, count) if hashed else vocab_to_idx.get(term, -1)
             if j == -1:
                 continue
-            rows.append(i)
-            cols.append(j),
+            indices.append(j)
             data.append(count)
+        indptr.append(len(indices))
 
     # make sparse matrix
-    n_rows = len(idx_to_date)
-    n_cols = len(vocab_to_idx)
-    bow = csr_matrix((data, (rows, cols)), shape=(n_rows, n_cols))
+    bow = to_csr_matrix(indptr, indices, data, n_cols=len(vocab_to_idx))
     return bow, idx_to_date
 
+def scan_vocabulary_and_create_bow(date_docs, tokenizer, min_count=20):
+    """
+    Arguments
+    ---------
+    date_docs : Any type iterable data that yield (date, [doc])
+    tokenizer : callable
+        tokenizer(doc) : list of str
+    min_count : int
+        Minimum frequency of vocabulary
+
+    Returns
+    -------
+    bow : scipy.sparse.csr_matrix
+        (date, term) frequency matrix. dtype of values is int32
+    idx_to_date : list of str
+        Each str stands for date
+    idx_to_vocab : list of str
+        Each str stands for word
+    vocab_to_idx : {str:int}
+        Vocabulary index map
+
+    It returns same results with scan_vocabulary followed by create_bow_date_merged,
+    but it tokenizes each document only once. Term frequencies of all terms are
+    accumulated with temporary term index, and infrequent terms are removed
+    by remapping the columns of the built matrix.
+
+    Usage
+    -----
+        >>> tokenizer = Tokenizer(Tagfilter({'/R'}))
+        >>> date_news = DateDocsDecorator(news, min_doc=10)
+        >>> bow, idx_to_date, idx_to_vocab, vocab_to_idx = scan_vocabulary_and_create_bow(
+        >>>     date_news, tokenizer, min_count=5)
+    """
+    idx_to_date = []
+    term_to_tmp = {}
+    indptr = array('q', [0])
+    indices = array('i')
+    data = array('i')
+    for date, docs in date_docs:
+        idx_to_date.append(date)
+        tf = Counter(word for doc in docs for word in tokenizer(doc))
+        for term, count in tf.items():
+            j = term_to_tmp.get(term, -1)
+            if j == -1:
+                j = len(term_to_tmp)
+                term_to_tmp[term] = j
+            indices.append(j)
+            data.append(count)
+        indptr.append(len(indices))
+
+    bow = to_csr_matrix(indptr, indices, data, n_cols=len(term_to_tmp))
+
+    # vocabulary pruning
+    counts = np.bincount(bow.indices, weights=bow.data, minlength=len(term_to_tmp)).astype(np.int64)
+    tmp_to_term = [term for term in term_to_tmp]
+    frequent = np.where(counts >= min_count)[0]
+    frequent = sorted(frequent, key=lambda j:(-counts[j], tmp_to_term[j]))
+    idx_to_vocab = [tmp_to_term[j] for j in frequent]
+    vocab_to_idx = {vocab:idx for idx, vocab in enumerate(idx_to_vocab)}
+
+    # column remapping
+    remap = np.full(len(term_to_tmp), -1, dtype=np.int32)
+    remap[np.asarray(frequent, dtype=np.int64)] = np.arange(len(frequent), dtype=np.int32)
+    indices = remap[bow.indices]
+    mask = indices >= 0
+    indptr = np.concatenate([[0], np.cumsum(mask)])[bow.indptr]
+    bow = csr_matrix((bow.data[mask], indices[mask], indptr),
+        shape=(len(idx_to_date), len(idx_to_vocab)))
+    bow.sort_indices()
+    return bow, idx_to_date, idx_to_vocab, vocab_to_idx
+
 def create_bow(docs, tokenizer, vocab_to_idx):
     """
     Arguments
@@ -184,7 +686,7 @@ def create_bow(docs, tokenizer, vocab_to_idx):
     Returns
     -------
     bow : scipy.sparse.csr_matrix
-        (date, term) frequency matrix
+        (date, term) frequency matrix. dtype of values is int32
 
     Usage
     -----
@@ -193,24 +695,57 @@ def create_bow(docs, tokenizer, vocab_to_idx):
         >>> idx_to_vocab, vocab_to_idx = scan_vocabulary(date_news, tokenizer, min_count=5)
         >>> bow = create_bow(date_news, tokenizer, vocab_to_idx)
     """
-    rows, cols, data = [], [], []
-    for i, doc in enumerate(docs):
+    indptr = array('q', [0])
+    indices = array('i')
+    data = array('i')
+    # side table of HashedVocabulary counts term frequency
+    hashed = isinstance(vocab_to_idx, HashedVocabulary)
+    for doc in docs:
         # count term frequency
         tf = Counter(tokenizer(doc))
         for term, count in tf.items():
-            j = vocab_to_idx.get(term, -1)
+            j = vocab_to_idx.add(term, count) if hashed else vocab_to_idx.get(term, -1)
             if j == -1:
                 continue
-            rows.append(i)
-            cols.append(j),
+            indices.append(j)
             data.append(count)
+        indptr.append(len(indices))
 
     # make sparse matrix
-    n_rows = len(docs)
-    n_cols = len(vocab_to_idx)
-    bow = csr_matrix((data, (rows, cols)), shape=(n_rows, n_cols))
+    bow = to_csr_matrix(indptr, indices, data, n_cols=len(vocab_to_idx))
     return bow
 
+def to_csr_matrix(indptr, indices, data, n_cols):
+    """
+    Arguments
+    ---------
+    indptr : array.array
+        typecode 'q'. Row pointer which begins with 0
+    indices : array.array
+        typecode 'i'. Column index of each nonzero
+    data : array.array
+        typecode 'i'. Value of each nonzero
+    n_cols : int
+        Number of columns
+
+    Returns
+    -------
+    scipy.sparse.csr_matrix
+        It wraps the buffers without COO to CSR conversion.
+        Values are int32 (COO conversion of Python int lists made int64),
+        so a count must be smaller than 2 ** 31.
+        Column indices are sorted in each row, and duplicated column indices
+        in a row (collision of HashedVocabulary) are summed.
+    """
+    indptr = np.frombuffer(indptr, dtype=np.int64)
+    if indptr[-1] <= np.iinfo(np.int32).max:
+        indptr = indptr.astype(np.int32)
+    indices = np.frombuffer(indices, dtype=np.int32)
+    data = np.frombuffer(data, dtype=np.int32)
+    csr = csr_matrix((data, indices, indptr), shape=(indptr.shape[0] - 1, n_cols), copy=False)
+    csr.sum_duplicates()
+    return csr
+
 def recover_rtokenized_sent(sent):
     """
         >>> recover_rtokenized_sent('지방선거 참패 이후 당 혁신 과/R 재정비 를/R 놓고')
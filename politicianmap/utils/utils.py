@@ -1,5 +1,9 @@
+from array import array
+from bisect import bisect_left
+from bisect import bisect_right
 from glob import glob
 import os
+import pickle
 
 
 class News:
@@ -7,27 +11,39 @@ class News:
         >>> news = News('../data/politician/0/')
         >>> for i, doc in enumerate(news.get_news(begin_date = '2018-01-01', end_date='2018-01-03')):
         >>>     print(doc[:200], end='\n\n')
+
+    To create News of many date ranges from one directory, load manifest once and share it
+
+        >>> manifest = load_manifest('../data/politician/0/')
+        >>> news = News('../data/politician/0/', begin_date='2018-01-01', end_date='2018-02-28', manifest=manifest)
     """
 
-    def __init__(self, dirname, indexdirname=None, begin_date=None, end_date=None):
+    def __init__(self, dirname, indexdirname=None, begin_date=None, end_date=None,
+        rebuild_manifest=False, manifest=None):
+
         self.dirname = dirname
         if indexdirname is None:
             indexdirname = dirname
-        self.newspath = sorted(glob('{}/news/*.txt'.format(dirname)))
-        self.indexpath = sorted(glob('{}/news/*.index'.format(indexdirname)))
+        if manifest is None:
+            manifest = load_manifest(dirname, indexdirname, rebuild=rebuild_manifest)
+        self.manifest = manifest
         if (begin_date is None) or (end_date is None):
-            self.dates = [p.split('/')[-1][:10] for p in self.newspath]
+            self.dates = [date for date, path in zip(manifest['dates'], manifest['newspath']) if path]
 
         begin_date, end_date = self._set_date(begin_date, end_date)
-        self.newspath = [p for p in self.newspath if begin_date <= parse_date(p) <= end_date]
-        self.indexpath = [p for p in self.indexpath if begin_date <= parse_date(p) <= end_date]
+        b = bisect_left(manifest['dates'], begin_date)
+        e = bisect_right(manifest['dates'], end_date)
+        self._entries = [i for i in range(b, e)]
+        self.newspath = [manifest['newspath'][i] for i in self._entries if manifest['newspath'][i]]
+        self.indexpath = [manifest['indexpath'][i] for i in self._entries if manifest['indexpath'][i]]
 
         if len(self.newspath) != len(self.indexpath):
             print('num news  = {}'.format(len(self.newspath)))
             print('num index = {}'.format(len(self.indexpath)))
 
-        self.dates = [p.split('/')[-1][:10] for p in self.newspath]
-        self.date_to_ndocs = line_counts(indexdirname, begin_date, end_date)
+        self.dates = [manifest['dates'][i] for i in self._entries if manifest['newspath'][i]]
+        self.date_to_ndocs = [(manifest['dates'][i], manifest['n_docs'][i])
+            for i in self._entries if manifest['indexpath'][i]]
         self.n_docs = sum(c for _, c in self.date_to_ndocs)
         print('{} has news of {} dates, {} docs'.format(
             dirname, len(self.newspath), self.n_docs))
@@ -78,9 +94,68 @@ class News:
         """
 
         begin_date, end_date = self._set_date(begin_date, end_date)
-        for doc in self._iter(begin_date, end_date, self.newspath):
+        for doc in self._iter(begin_date, end_date, 'newspath'):
             yield doc
 
+    def get_sents(self, begin_date=None, end_date=None):
+        """
+        Arguments
+        ---------
+        begin_date : str
+            yyyy-mm-dd format
+        end_date : str
+            yyyy-mm-dd format
+
+        Returns
+        -------
+        list of str
+            Sentences of docs in the period. A doc is split with double space.
+        """
+
+        return [sent for doc in self.iter_news(begin_date, end_date) for sent in doc.split('  ')]
+
+    def get_path(self, date):
+        """
+        Argument
+        --------
+        date : str
+            yyyy-mm-dd format
+
+        Returns
+        -------
+        str
+            News file path of the date
+        """
+
+        return self.manifest['newspath'][self._find(date)]
+
+    def get_doc(self, date, i):
+        """
+        Arguments
+        ---------
+        date : str
+            yyyy-mm-dd format
+        i : int
+            Line number of the news in the date file
+
+        Returns
+        -------
+        str
+            Doublespace line format document of a news.
+            It seeks the byte offset stored in manifest instead of scanning the file.
+        """
+
+        j = self._find(date)
+        path = self.manifest['newspath'][j]
+        with open(path, 'rb') as f:
+            # the file was rewritten in place after the manifest was built
+            stat = os.fstat(f.fileno())
+            if (stat.st_size, stat.st_mtime_ns) != self.manifest['stats'][path]:
+                self.manifest['offsets'][j] = line_offsets(path)
+                self.manifest['stats'][path] = (stat.st_size, stat.st_mtime_ns)
+            f.seek(self.manifest['offsets'][j][i])
+            return f.readline().decode('utf-8').strip()
+
     def get_index(self, begin_date=None, end_date=None):
         """
         Arguments
@@ -128,7 +203,7 @@ class News:
         """
 
         begin_date, end_date = self._set_date(begin_date, end_date)
-        for doc in self._iter(begin_date, end_date, self.indexpath):
+        for doc in self._iter(begin_date, end_date, 'indexpath'):
             yield doc
 
     def _set_date(self, begin_date, end_date):
@@ -138,16 +213,169 @@ class News:
             end_date = self.dates[-1]
         return begin_date, end_date
 
-    def _iter(self, begin_date, end_date, paths):
-        for path in paths:
-            file_date = path.split('/')[-1][:10]
-            if not (begin_date <= file_date <= end_date):
+    def _find(self, date):
+        dates = self.manifest['dates']
+        j = bisect_left(dates, date)
+        if j == len(dates) or dates[j] != date or not self.manifest['newspath'][j]:
+            raise ValueError('Not found news of date {}'.format(date))
+        return j
+
+    def _iter(self, begin_date, end_date, key):
+        dates = self.manifest['dates']
+        paths = self.manifest[key]
+        b = max(bisect_left(dates, begin_date), self._entries[0] if self._entries else 0)
+        e = min(bisect_right(dates, end_date), self._entries[-1] + 1 if self._entries else 0)
+        for j in range(b, e):
+            if not paths[j]:
                 continue
-            with open(path, encoding='utf-8') as f:
+            with open(paths[j], encoding='utf-8') as f:
                 for doc in f:
                     yield doc.strip()
 
 
+def build_manifest(dirname, indexdirname=None, previous=None):
+    """
+    Arguments
+    ---------
+    dirname : str
+        Directory path which has news/yyyy-mm-dd_*.txt files
+    indexdirname : str
+        Directory path which has news/yyyy-mm-dd_*.index files
+        If it is None, use dirname
+    previous : dict or None
+        Previously built manifest. Line counts and offsets of files
+        whose (size, mtime) are not changed are reused
+
+    Returns
+    -------
+    manifest : dict
+        It has sorted dates and aligned lists of absolute news path, index path,
+        number of docs (lines of index file) and byte offsets of each news line.
+        A path is None if the file of the date does not exist.
+        'stats' has (size, mtime) of each file, and 'dirstate' has (mtime, number of files)
+        of news directories. They are used to check whether files are changed.
+
+    Usage
+    -----
+        >>> manifest = build_manifest('/workspace/data/politician/0/')
+        >>> manifest['dates'][:2]
+        $ ['2013-01-01', '2013-01-02']
+    """
+    if indexdirname is None:
+        indexdirname = dirname
+    dirname = os.path.abspath(dirname)
+    indexdirname = os.path.abspath(indexdirname)
+    # before glob, so files added while building make the manifest out of date
+    dirstate = _news_dir_state(dirname, indexdirname)
+    newspath = {parse_date(p):p for p in glob('{}/news/*.txt'.format(dirname))}
+    indexpath = {parse_date(p):p for p in glob('{}/news/*.index'.format(indexdirname))}
+    dates = sorted(set(newspath) | set(indexpath))
+    stats = {p:_file_stat(p) for p in list(newspath.values()) + list(indexpath.values())}
+
+    # (path, stat) -> line count or offsets of previous manifest
+    reusable = {}
+    if previous is not None and 'stats' in previous:
+        for key, values in [('indexpath', 'n_docs'), ('newspath', 'offsets')]:
+            for path, value in zip(previous[key], previous[values]):
+                if path in previous['stats']:
+                    reusable[(path, previous['stats'][path])] = value
+
+    def get(path, compute):
+        value = reusable.get((path, stats[path]))
+        return compute(path) if value is None else value
+
+    manifest = {
+        'dirname': dirname,
+        'indexdirname': indexdirname,
+        'stats': stats,
+        'dirstate': dirstate,
+        'dates': dates,
+        'newspath': [newspath.get(d, None) for d in dates],
+        'indexpath': [indexpath.get(d, None) for d in dates],
+        'n_docs': [get(indexpath[d], line_count) if d in indexpath else 0 for d in dates],
+        'offsets': [get(newspath[d], line_offsets) if d in newspath else array('q') for d in dates]
+    }
+    return manifest
+
+def load_manifest(dirname, indexdirname=None, rebuild=False):
+    """
+    Arguments
+    ---------
+    dirname : str
+        Directory path which has news/yyyy-mm-dd_*.txt files
+    indexdirname : str
+        Directory path which has news/yyyy-mm-dd_*.index files
+        If it is None, use dirname
+    rebuild : Boolean
+        If True, build manifest even though cached manifest exists
+
+    Returns
+    -------
+    manifest : dict
+        Same with build_manifest.
+        It is cached as {dirname}/news_manifest.pkl and is updated when
+        mtime or number of files of news directories is changed (files are added,
+        removed or replaced). It does not stat each file, so a file rewritten in place
+        is not detected here; News.get_doc checks (size, mtime) of the file it reads.
+        Rebuild reuses line counts and offsets of files whose (size, mtime) are not changed.
+    """
+    if indexdirname is None:
+        indexdirname = dirname
+    path = '{}/news_manifest.pkl'.format(dirname)
+    previous = None
+    if not rebuild and os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                previous = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            previous = None
+        if (previous is not None and
+            previous.get('indexdirname') == os.path.abspath(indexdirname) and
+            'stats' in previous and
+            previous.get('dirstate') == _news_dir_state(dirname, indexdirname)):
+            return previous
+    manifest = build_manifest(dirname, indexdirname, previous)
+    # parallel tasks may read manifest while it is written
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(manifest, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        print('failed to write news manifest {}'.format(path))
+    return manifest
+
+def _file_stat(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+def _news_dir_state(dirname, indexdirname):
+    def state(path):
+        if not os.path.exists(path):
+            return (0, 0)
+        return (os.stat(path).st_mtime_ns, len(os.listdir(path)))
+    return (state('{}/news'.format(dirname)), state('{}/news'.format(indexdirname)))
+
+def line_offsets(path):
+    """
+    Argument
+    --------
+    path : str
+        File path
+
+    Returns
+    -------
+    array.array
+        Byte offset of the beginning of each line
+    """
+    offsets = array('q')
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            offsets.append(offset)
+            offset += len(line)
+    return offsets
+
 def check_dir(path):
     dirname = os.path.dirname(path)
     if not os.path.exists(dirname):
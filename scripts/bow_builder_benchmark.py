@@ -0,0 +1,66 @@
+import argparse
+import random
+import time
+import tracemalloc
+from collections import Counter
+from scipy.sparse import csr_matrix
+from politicianmap.utils import Tokenizer, Tagfilter, create_bow
+
+
+def create_bow_coo(docs, tokenizer, vocab_to_idx):
+    # previous implementation: rows, cols, data lists and COO to CSR conversion
+    rows, cols, data = [], [], []
+    for i, doc in enumerate(docs):
+        tf = Counter(tokenizer(doc))
+        for term, count in tf.items():
+            j = vocab_to_idx.get(term, -1)
+            if j == -1:
+                continue
+            rows.append(i)
+            cols.append(j)
+            data.append(count)
+    n_rows = len(docs)
+    n_cols = len(vocab_to_idx)
+    return csr_matrix((data, (rows, cols)), shape=(n_rows, n_cols))
+
+def make_synthetic_corpus(n_docs, n_vocab, doc_len, seed=0):
+    random.seed(seed)
+    idx_to_vocab = ['w{}'.format(i) for i in range(n_vocab)]
+    # zipf-like frequency
+    weights = [1 / (i + 1) for i in range(n_vocab)]
+    docs = [' '.join(random.choices(idx_to_vocab, weights=weights, k=doc_len)) for _ in range(n_docs)]
+    vocab_to_idx = {vocab:idx for idx, vocab in enumerate(idx_to_vocab)}
+    return docs, vocab_to_idx
+
+def measure(func, *args):
+    tracemalloc.start()
+    begin_time = time.time()
+    result = func(*args)
+    elapsed = time.time() - begin_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_docs', type=int, default=50000)
+    parser.add_argument('--n_vocab', type=int, default=100000)
+    parser.add_argument('--doc_len', type=int, default=300)
+
+    args = parser.parse_args()
+    docs, vocab_to_idx = make_synthetic_corpus(args.n_docs, args.n_vocab, args.doc_len)
+    tokenizer = Tokenizer(Tagfilter({'/R'}))
+    print('synthetic corpus: {} docs, {} vocabs, {} words per doc'.format(
+        args.n_docs, args.n_vocab, args.doc_len))
+
+    bow_coo, coo_time, coo_peak = measure(create_bow_coo, docs, tokenizer, vocab_to_idx)
+    bow_csr, csr_time, csr_peak = measure(create_bow, docs, tokenizer, vocab_to_idx)
+    assert (bow_coo != bow_csr).nnz == 0
+
+    print('nnz = {}'.format(bow_csr.nnz))
+    print('{:<12} {:>10} {:>16}'.format('builder', 'time (sec)', 'peak memory (MB)'))
+    print('{:<12} {:>10.2f} {:>16.1f}'.format('lists + coo', coo_time, coo_peak / 2 ** 20))
+    print('{:<12} {:>10.2f} {:>16.1f}'.format('array csr', csr_time, csr_peak / 2 ** 20))
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,13 @@
 import argparse
 import os
-from scipy.io import mmwrite
+from glob import glob
 from politicianmap.utils import check_dir
+from politicianmap.utils import DailyBow
+from politicianmap.utils import add_parallel_arguments, run_tasks
 from politicianmap.utils import News, DateDocsDecorator
-from politicianmap.utils import Tokenizer, Tagfilter, scan_vocabulary, create_bow
+from politicianmap.utils import Tokenizer, Tagfilter, create_bow
+from politicianmap.utils import count_terms, merge_term_counts, vocabulary_from_counts
+from politicianmap.utils import save_term_counts, load_term_counts
 
 
 def write_list(path, items):
@@ -11,34 +15,61 @@ def write_list(path, items):
         for item in items:
             f.write('{}\n'.format(item))
 
-def make_merged_date_news(data_dir, index_dir, index, min_doc=15, debug=True):
-    # variables for debug
-    begin_date, end_date = '2018-01-01', '2018-01-10'
-
-    # instance class
-    class MergedNews:
-        def __init__(self, date_news_sequence):
-            self.date_news_sequence = date_news_sequence
-        def __iter__(self):
-            for date_news in self.date_news_sequence:
-                for date, docs in date_news:
-                    yield date, docs
-
-    # merging news for all idxs
-    news_sequence = []
-    for idx in index:
-        if debug:
-            news = News('{}/{}/'.format(data_dir, idx), '{}/{}/'.format(index_dir, idx), begin_date, end_date)
-        else:
-            news = News('{}/{}/'.format(data_dir, idx), '{}/{}/'.format(index_dir, idx))
-        news_sequence.append(news)
-    merged_data_news = MergedNews([DateDocsDecorator(news, min_doc=min_doc) for news in news_sequence])
-    return merged_data_news
-
-def scaning_vocabulary(date_news, debug=True):
-    tokenizer = Tokenizer(Tagfilter({'/R'}))
-    idx_to_vocab, vocab_to_idx = scan_vocabulary(date_news, tokenizer, min_count=5 if debug else 20)
-    return idx_to_vocab, vocab_to_idx
+def load_news(data_dir, index_dir, idx, debug):
+    if debug:
+        return News('{}/{}/'.format(data_dir, idx), '{}/{}/'.format(index_dir, idx),
+            begin_date = '2018-01-01', end_date = '2018-01-10')
+    return News('{}/{}/'.format(data_dir, idx), '{}/{}/'.format(index_dir, idx))
+
+def counts_path(output_dir, idx):
+    return '{}/term_counts/{}.txt'.format(output_dir, idx)
+
+def count_terms_a_politician(data_dir, index_dir, output_dir, idx, min_doc, debug):
+    # tokenize news of a politician once. Own and universal vocabularies are derived from the counts
+    tokenizer = Tokenizer(Tagfilter({'/R'})).compile()
+    date_news = DateDocsDecorator(load_news(data_dir, index_dir, idx, debug), min_doc=min_doc)
+    save_term_counts(counts_path(output_dir, idx), count_terms(date_news, tokenizer))
+
+def news_inputs(data_dir, index_dir, idx):
+    """news and index files of a politician"""
+    return (glob('{}/{}/news/*.txt'.format(data_dir, idx)) +
+            glob('{}/{}/news/*.index'.format(index_dir, idx)))
+
+def is_up_to_date(path, inputs):
+    """True if path exists and it is newer than all inputs"""
+    if not os.path.exists(path):
+        return False
+    return not inputs or os.path.getmtime(path) >= max(os.path.getmtime(p) for p in inputs)
+
+def vocabulary(counter, debug=True):
+    return vocabulary_from_counts(counter, min_count=5 if debug else 20)
+
+def train_daily_bow_a_politician(data_dir, index_dir, output_dir, idx, min_doc, debug, vocab_to_idx_univ=None):
+    tokenizer = Tokenizer(Tagfilter({'/R'})).compile()
+
+    # create data loader
+    date_news = DateDocsDecorator(load_news(data_dir, index_dir, idx, debug), min_doc=min_doc)
+    # their own vocabulary from term counts
+    idx_to_vocab, vocab_to_idx = vocabulary(load_term_counts(counts_path(output_dir, idx)), debug)
+    path = '{0}/{1}/{1}_vocab.txt'.format(output_dir, idx)
+    check_dir(path)
+    write_list(path, idx_to_vocab)
+
+    # all dates are stored in a container. Rows of a date range are read at once
+    daily_bow = DailyBow('{0}/{1}/{1}_bow'.format(output_dir, idx),
+        n_cols=len(vocab_to_idx), overwrite=True)
+    if vocab_to_idx_univ is not None:
+        daily_bow_univ = DailyBow('{0}/{1}/{1}_universal_bow'.format(output_dir, idx),
+            n_cols=len(vocab_to_idx_univ), overwrite=True)
+
+    for date, docs in date_news:
+        # vectorize with their own vocabulary
+        daily_bow.append(date, create_bow(docs, tokenizer, vocab_to_idx))
+        # vectorize with universal vocabulary
+        if vocab_to_idx_univ is not None:
+            daily_bow_univ.append(date, create_bow(docs, tokenizer, vocab_to_idx_univ))
+        print('\rcreated bow {} / {}'.format(idx, date), end='')
+    print('\rcreated bow {} of {} dates'.format(idx, len(daily_bow)))
 
 def main():
     parser = argparse.ArgumentParser()
@@ -50,6 +81,7 @@ def main():
     parser.add_argument('--max_index', type=int, default=20)
     parser.add_argument('--debug', dest='debug', action='store_true')
     parser.add_argument('--use_universal_vocab', dest='use_universal_vocab', action='store_true')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     data_dir = os.path.abspath(args.data_dir)
@@ -62,41 +94,32 @@ def main():
     if index is None:
         index = [i for i in range(args.max_index)]
 
-    # scan universal vocabulary
-    merged_data_news = make_merged_date_news(data_dir, index_dir, index, min_doc, debug)
-    idx_to_vocab_univ, vocab_to_idx_univ = scaning_vocabulary(merged_data_news, debug)
+    # count terms of each politician in parallel.
+    # Counts newer than news and index files of the politician are reused
+    marker_dir = None if debug else '{}/.done'.format(output_dir)
+    tasks = []
+    for idx in index:
+        inputs = news_inputs(data_dir, index_dir, idx)
+        if not debug and not args.rerun and is_up_to_date(counts_path(output_dir, idx), inputs):
+            print('[term_counts] skip {} (up to date)'.format(idx))
+            continue
+        tasks.append((idx, (data_dir, index_dir, output_dir, idx, min_doc, debug)))
+    failed = run_tasks(count_terms_a_politician, tasks, args.workers, name='term_counts')
+    if failed:
+        raise RuntimeError('Failed to count terms of politicians {}'.format([key for key, _ in failed]))
+
+    # universal vocabulary by merging term counts, not rescanning corpus
+    counters = (load_term_counts(counts_path(output_dir, idx)) for idx in index)
+    idx_to_vocab_univ, vocab_to_idx_univ = vocabulary(merge_term_counts(counters), debug)
     path = '{}/universal_vocab.txt'.format(output_dir)
     check_dir(path)
     write_list(path, idx_to_vocab_univ)
 
-    tokenizer = Tokenizer(Tagfilter({'/R'}))
-
-    # scan their own vocabulary and vectorize
-    for idx in index:
-        # create data loader
-        if debug:
-            news = News('{}/{}/'.format(data_dir, idx), '{}/{}/'.format(index_dir, idx),
-                begin_date = '2018-01-01', end_date = '2018-01-10')
-        else:
-            news = News('{}/{}/'.format(data_dir, idx), '{}/{}/'.format(index_dir, idx))
-        date_news = DateDocsDecorator(news, min_doc=min_doc)
-        # scan their own vocabulary
-        print('scaning vocabulary {}'.format(idx))
-        idx_to_vocab, vocab_to_idx = scaning_vocabulary(date_news, debug)
-        path = '{0}/{1}/{1}_vocab.txt'.format(output_dir, idx)
-        check_dir(path)
-        write_list(path, idx_to_vocab)
-
-        for date, docs in date_news:
-            # vectorize with their own vocabulary
-            bow = create_bow(docs, tokenizer, vocab_to_idx)
-            path = '{0}/{1}/{1}_{2}.mtx'.format(output_dir, idx, date)
-            mmwrite(path, bow)
-            # vectorize with universal vocabulary
-            bow = create_bow(docs, tokenizer, vocab_to_idx)
-            path = '{0}/{1}/{1}_{2}.mtx'.format(output_dir, idx, date)
-            mmwrite(path, bow)
-            print('created bow {} / {}'.format(idx, date))
+    # vectorize with their own vocabulary
+    if not args.use_universal_vocab:
+        vocab_to_idx_univ = None
+    tasks = [(idx, (data_dir, index_dir, output_dir, idx, min_doc, debug, vocab_to_idx_univ)) for idx in index]
+    run_tasks(train_daily_bow_a_politician, tasks, args.workers, marker_dir, args.rerun, name='bow_daily')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,45 @@
+import argparse
+import os
+import re
+from glob import glob
+from politicianmap.utils import bow_exists, convert_mtx
+
+
+def read_list(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bow_dirname', type=str, default='/workspace/lovit/politicianmap/bow/')
+    parser.add_argument('--remove_mtx', dest='remove_mtx', action='store_true')
+
+    args = parser.parse_args()
+    bow_dirname = os.path.abspath(args.bow_dirname)
+
+    # convert Matrix Market files to BOW store.
+    # {head}_bow_{idx}.mtx of bow_trainer.py is saved with its vocab and date lists
+    pattern = re.compile(r'(each|universial)_bow_(\d+)')
+    for mtx_path in sorted(glob('{}/**/*.mtx'.format(bow_dirname), recursive=True)):
+        path = mtx_path[:-4]
+        if bow_exists(path):
+            continue
+        idx_to_vocab, idx_to_date = None, None
+        match = pattern.fullmatch(os.path.basename(path))
+        if match:
+            dirname = os.path.dirname(path)
+            head, idx = match.groups()
+            if head == 'each':
+                idx_to_vocab = read_list('{}/each_vocab_{}.txt'.format(dirname, idx))
+            else:
+                idx_to_vocab = read_list('{}/universial_vocab.txt'.format(dirname))
+            idx_to_date = read_list('{}/{}_date_{}.txt'.format(dirname, head, idx))
+        bow = convert_mtx(mtx_path, path, idx_to_vocab, idx_to_date)
+        print('converted {} -> {} {}'.format(mtx_path, path, bow.shape))
+        if args.remove_mtx:
+            os.remove(mtx_path)
+
+if __name__ == '__main__':
+    main()
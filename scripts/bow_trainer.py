@@ -1,10 +1,17 @@
 import argparse
 import os
+from collections import defaultdict
 from glob import glob
 from politicianmap.utils import check_dir
+from politicianmap.utils import add_parallel_arguments, run_tasks
 from politicianmap.utils import News, DateDocsDecorator
 from politicianmap.utils import Tokenizer, Tagfilter, scan_vocabulary, create_bow_date_merged
-from scipy.io import mmwrite
+from politicianmap.utils import scan_vocabulary_and_create_bow
+from politicianmap.utils import HashedVocabulary
+from politicianmap.utils import scan_vocabulary_approximately
+from politicianmap.utils import save_bow
+from politicianmap.utils import save_term_counts, load_term_counts
+from politicianmap.utils import merge_term_counts, vocabulary_from_counts
 
 
 class MergedNews:
@@ -21,7 +28,7 @@ def write_list(path, items):
         for item in items:
             f.write('{}\n'.format(item))
 
-def scan_universial_vocabulary(data_dirname, index_dirname, output_dirname, politician, debug):
+def scan_universial_vocabulary(data_dirname, index_dirname, output_dirname, politician, debug, approximate=False):
     # variables for debug
     begin_date, end_date = '2018-01-01', '2018-01-10'
 
@@ -33,13 +40,70 @@ def scan_universial_vocabulary(data_dirname, index_dirname, output_dirname, poli
             news = News('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx))
         news_sequence.append(news)
     merged_data_news = MergedNews([DateDocsDecorator(news, min_doc=15) for news in news_sequence])
-    tokenizer = Tokenizer(Tagfilter({'/R'}))
-    idx_to_vocab, vocab_to_idx = scan_vocabulary(merged_data_news, tokenizer, min_count=5 if debug else 20)
+    tokenizer = Tokenizer(Tagfilter({'/R'})).compile()
+    if approximate:
+        idx_to_vocab, vocab_to_idx, uncertain = scan_vocabulary_approximately(
+            merged_data_news, tokenizer, min_count=5 if debug else 20, return_uncertain=True)
+        # (term, estimated count) of terms which may be less frequent than min_count
+        write_list('{}/universial_vocab_uncertain.txt'.format(output_dirname),
+            ['{}\t{}'.format(term, count) for term, count in uncertain])
+    else:
+        idx_to_vocab, vocab_to_idx = scan_vocabulary(merged_data_news, tokenizer, min_count=5 if debug else 20)
     # vocab write
     write_list('{}/universial_vocab.txt'.format(output_dirname), idx_to_vocab)
     return vocab_to_idx
 
-def train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, debug, vocab_to_idx=None):
+def counts_path(output_dirname, head, idx):
+    return '{}/term_counts/{}_{}.txt'.format(output_dirname, head, idx)
+
+def count_terms_a_politician(data_dirname, index_dirname, output_dirname, idx, debug):
+    """
+    Tokenize news of a politician once and write term counts of dates
+    used for its own vocabulary (min_doc=10) and universal vocabulary (min_doc=15)
+    """
+    # variables for debug
+    begin_date, end_date = '2018-01-01', '2018-01-10'
+
+    if debug:
+        news = News('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx), begin_date, end_date)
+    else:
+        news = News('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx))
+
+    tokenizer = Tokenizer(Tagfilter({'/R'})).compile()
+    date_to_ndocs = dict(news.date_to_ndocs)
+    each_counts, univ_counts = defaultdict(int), defaultdict(int)
+    for date, docs in DateDocsDecorator(news, min_doc=10):
+        is_universial = date_to_ndocs[date] >= 15
+        for doc in docs:
+            for word in tokenizer(doc):
+                each_counts[word] += 1
+                if is_universial:
+                    univ_counts[word] += 1
+    save_term_counts(counts_path(output_dirname, 'each', idx), each_counts)
+    save_term_counts(counts_path(output_dirname, 'universial', idx), univ_counts)
+
+def news_inputs(data_dirname, index_dirname, idx):
+    """news and index files of a politician"""
+    return (glob('{}/{}/news/*.txt'.format(data_dirname, idx)) +
+            glob('{}/{}/news/*.index'.format(index_dirname, idx)))
+
+def is_up_to_date(paths, inputs):
+    """True if all paths exist and they are newer than all inputs"""
+    if not all(os.path.exists(p) for p in paths):
+        return False
+    if not inputs:
+        return True
+    return min(os.path.getmtime(p) for p in paths) >= max(os.path.getmtime(p) for p in inputs)
+
+def merge_universial_vocabulary(output_dirname, politician, debug):
+    # O(vocab) merge of term counts instead of rescanning corpus of all politicians
+    counters = (load_term_counts(counts_path(output_dirname, 'universial', idx)) for idx in politician)
+    idx_to_vocab, vocab_to_idx = vocabulary_from_counts(
+        merge_term_counts(counters), min_count=5 if debug else 20)
+    write_list('{}/universial_vocab.txt'.format(output_dirname), idx_to_vocab)
+    return vocab_to_idx
+
+def train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, debug, vocab_to_idx=None, use_term_counts=False):
     head = 'each' if vocab_to_idx is None else 'universial'
 
     # variables for debug
@@ -51,20 +115,38 @@ def train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, deb
     else:
         news = News('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx))
 
-    tokenizer = Tokenizer(Tagfilter({'/R'}))
+    tokenizer = Tokenizer(Tagfilter({'/R'})).compile()
     date_news = DateDocsDecorator(news, min_doc=10)
-    if vocab_to_idx is None:
-        idx_to_vocab, vocab_to_idx = scan_vocabulary(date_news, tokenizer, min_count=5 if debug else 20)
-    bow, idx_to_date = create_bow_date_merged(date_news, tokenizer, vocab_to_idx)
+    if vocab_to_idx is None and use_term_counts:
+        # own vocabulary from term counts written (or checked up to date) in this run
+        idx_to_vocab, vocab_to_idx = vocabulary_from_counts(
+            load_term_counts(counts_path(output_dirname, 'each', idx)), min_count=5 if debug else 20)
+        bow, idx_to_date = create_bow_date_merged(date_news, tokenizer, vocab_to_idx)
+    elif vocab_to_idx is None:
+        bow, idx_to_date, idx_to_vocab, vocab_to_idx = scan_vocabulary_and_create_bow(
+            date_news, tokenizer, min_count=5 if debug else 20)
+    else:
+        if isinstance(vocab_to_idx, HashedVocabulary):
+            # side table of each politician. In single process, the instance is shared by tasks
+            vocab_to_idx = HashedVocabulary(vocab_to_idx.n_features, vocab_to_idx.n_frequent, vocab_to_idx.table_size)
+        bow, idx_to_date = create_bow_date_merged(date_news, tokenizer, vocab_to_idx)
+        if isinstance(vocab_to_idx, HashedVocabulary):
+            # hashed columns. frequent terms of the politician are written as side table
+            idx_to_vocab = None
+            vocab_to_idx.save('{}/{}_hashed_terms_{}.txt'.format(output_dirname, head, idx))
+        else:
+            idx_to_vocab = [vocab for vocab, _ in sorted(vocab_to_idx.items(), key=lambda x:x[1])]
     print('[Politician {}, {}]: bow shape = {}'.format(idx, head, bow.shape))
 
-    # matrix write
-    mmwrite('{}/{}_bow_{}.mtx'.format(output_dirname, head, idx), bow)
-    # vocab write
-    if head == 'each':
-        write_list('{}/{}_vocab_{}.txt'.format(output_dirname, head, idx), idx_to_vocab)
-    # date write
-    write_list('{}/{}_date_{}.txt'.format(output_dirname, head, idx), idx_to_date)
+    # matrix, vocab and date write
+    save_bow('{}/{}_bow_{}'.format(output_dirname, head, idx), bow, idx_to_vocab, idx_to_date)
+
+def train_bow_both_vocabs(data_dirname, index_dirname, output_dirname, idx, debug, univ_vocab_to_idx, use_term_counts):
+    train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, debug, use_term_counts=use_term_counts)
+    print('trained politician {} bow model for each'.format(idx), end='\n\n')
+
+    train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, debug, univ_vocab_to_idx)
+    print('trained politician {} bow model with universial vocab'.format(idx), end='\n\n')
 
 def main():
     parser = argparse.ArgumentParser()
@@ -73,6 +155,11 @@ def main():
     parser.add_argument('--output_dirname', type=str, default='/workspace/lovit/politicianmap/bow/')
     parser.add_argument('--politician', type=int, nargs='*', default=None)
     parser.add_argument('--debug', dest='debug', action='store_true')
+    parser.add_argument('--n_hash_features', type=int, default=0,
+        help='If positive, universal BOW uses hashed vocabulary of the number of columns instead of vocabulary scan')
+    parser.add_argument('--approximate_vocab', dest='approximate_vocab', action='store_true',
+        help='Scan universal vocabulary with bounded memory count-min sketch')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     data_dirname = os.path.abspath(args.data_dirname)
@@ -84,16 +171,44 @@ def main():
         politician = [i for i in range(20)]
 
     check_dir(output_dirname)
-    univ_vocab_to_idx = scan_universial_vocabulary(data_dirname, index_dirname, output_dirname, politician, debug)
-
-    for idx in politician:
-        train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, debug)
-        print('trained politician {} bow model for each'.format(idx), end='\n\n')
+    marker_dir = None if debug else '{}/.done'.format(output_dirname)
+    # term counts are used only when they are written or checked in this run
+    use_term_counts = False
+    if args.n_hash_features > 0:
+        univ_vocab_to_idx = HashedVocabulary(args.n_hash_features)
+    elif args.approximate_vocab:
+        univ_vocab_to_idx = scan_universial_vocabulary(data_dirname, index_dirname,
+            output_dirname, politician, debug, approximate=True)
+    else:
+        # term counts of each politician in parallel, and merge them.
+        # Counts newer than news and index files of the politician are reused
+        tasks = []
+        for idx in politician:
+            paths = [counts_path(output_dirname, head, idx) for head in ['each', 'universial']]
+            if not debug and not args.rerun and is_up_to_date(paths, news_inputs(data_dirname, index_dirname, idx)):
+                print('[term_counts] skip {} (up to date)'.format(idx))
+                continue
+            tasks.append((idx, (data_dirname, index_dirname, output_dirname, idx, debug)))
+        failed = run_tasks(count_terms_a_politician, tasks, args.workers, name='term_counts')
+        if failed:
+            raise RuntimeError('Failed to count terms of politicians {}'.format([key for key, _ in failed]))
+        univ_vocab_to_idx = merge_universial_vocabulary(output_dirname, politician, debug)
+        use_term_counts = True
 
-        train_bow_a_politician(data_dirname, index_dirname, output_dirname, idx, debug, univ_vocab_to_idx)
-        print('trained politician {} bow model with universial vocab'.format(idx), end='\n\n')
-        if debug and idx >= 3:
-            break
+    if debug:
+        politician = politician[:4]
+
+    tasks = [(idx, (data_dirname, index_dirname, output_dirname, idx, debug, univ_vocab_to_idx, use_term_counts))
+             for idx in politician]
+    run_tasks(train_bow_both_vocabs, tasks, args.workers, marker_dir, args.rerun, name='bow')
+
+    if args.n_hash_features > 0:
+        # merge side tables of politicians instead of universal vocabulary scan
+        for idx in politician:
+            path = '{}/universial_hashed_terms_{}.txt'.format(output_dirname, idx)
+            if os.path.exists(path):
+                univ_vocab_to_idx.merge(HashedVocabulary.load(path))
+        univ_vocab_to_idx.save('{}/universial_hashed_terms.txt'.format(output_dirname))
 
 if __name__ == '__main__':
     main()
@@ -1,11 +1,13 @@
 import argparse
 import os
-import pickle
 from glob import glob
 from gensim.models import Doc2Vec
 from gensim.models.doc2vec import TaggedDocument
 from politicianmap.utils import check_dir
 from politicianmap.utils import News
+from politicianmap.representation import save_doc2vec
+from politicianmap.representation import load_tagged_corpus
+from politicianmap.utils import add_parallel_arguments, run_tasks
 
 
 class Input:
@@ -50,7 +52,7 @@ class AllInput:
         print('\r[Politician all] iter = {0}, files = {1} / {1} was done '.format(self.n_iter, self.n_files))
 
 
-def train_doc2vec_a_politician(data_dirname, index_dirname, idx, debug):
+def train_doc2vec_a_politician(data_dirname, index_dirname, corpus_dirname, idx, debug, rebuild_corpus):
     # variables for debug
     begin_date, end_date = '2018-01-01', '2018-01-10'
 
@@ -60,42 +62,53 @@ def train_doc2vec_a_politician(data_dirname, index_dirname, idx, debug):
     else:
         news = News('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx))
 
-    doc2vec = Doc2Vec( Input(news, header='[Politician %d]'%idx), min_count=15 )
-    doc2vec_path = '/workspace/lovit/politicianmap/doc2vec_models/doc2vec_politician_{}.pkl'.format(idx)
+    header = '[Politician %d]'%idx
+    corpus_path = '{}/{}{}'.format(corpus_dirname, idx, '_debug' if debug else '')
+    corpus = load_tagged_corpus(Input(news, header=header), corpus_path, header,
+        rebuild_corpus, inputs=news.newspath)
+    doc2vec = Doc2Vec(corpus, min_count=15)
+    doc2vec_path = '/workspace/lovit/politicianmap/doc2vec_models/doc2vec_politician_{}.model'.format(idx)
     check_dir(doc2vec_path)
-    with open(doc2vec_path, 'wb') as f:
-        pickle.dump(doc2vec, f)
+    save_doc2vec(doc2vec, doc2vec_path)
 
-def train_doc2vec_for_all_politician(data_dirname, debug):
-    inputs = AllInput(data_dirname, debug=debug)
-    doc2vec = Doc2Vec(inputs, min_count=(10 if debug else 20))
-    doc2vec_path = '/workspace/lovit/politicianmap/doc2vec_models/doc2vec_politician_all.pkl'
+def train_doc2vec_for_all_politician(data_dirname, corpus_dirname, debug, rebuild_corpus):
+    corpus_path = '{}/all{}'.format(corpus_dirname, '_debug' if debug else '')
+    all_input = AllInput(data_dirname, debug=debug)
+    corpus = load_tagged_corpus(all_input, corpus_path, '[Politician all]',
+        rebuild_corpus, inputs=all_input.paths)
+    doc2vec = Doc2Vec(corpus, min_count=(10 if debug else 20))
+    doc2vec_path = '/workspace/lovit/politicianmap/doc2vec_models/doc2vec_politician_all.model'
     check_dir(doc2vec_path)
-    with open(doc2vec_path, 'wb') as f:
-        pickle.dump(doc2vec, f)
+    save_doc2vec(doc2vec, doc2vec_path)
 
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument('--data_dirname', type=str, default='/workspace/lovit/politicianmap/tokenized/')
     parser.add_argument('--index_dirname', type=str, default='/workspace/data/politician_norm/')
+    parser.add_argument('--corpus_dirname', type=str, default='/workspace/lovit/politicianmap/doc2vec_corpus/')
+    parser.add_argument('--rebuild_corpus', dest='rebuild_corpus', action='store_true')
     parser.add_argument('--politician', type=int, nargs='*', default=None)
     parser.add_argument('--debug', dest='debug', action='store_true')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     data_dirname = os.path.abspath(args.data_dirname)
     index_dirname = os.path.abspath(args.index_dirname)
+    corpus_dirname = os.path.abspath(args.corpus_dirname)
+    rebuild_corpus = args.rebuild_corpus
     debug = args.debug
     politician = args.politician
     if politician is None:
         politician = [i for i in range(20)]
 
-    for idx in politician:
-        train_doc2vec_a_politician(data_dirname, index_dirname, idx, debug)
-        print('trained politician {} doc2vec model'.format(idx), end='\n\n')
-        if debug and idx >= 3:
-            break
+    if debug:
+        politician = politician[:4]
+
+    tasks = [(idx, (data_dirname, index_dirname, corpus_dirname, idx, debug, rebuild_corpus)) for idx in politician]
+    marker_dir = None if debug else '/workspace/lovit/politicianmap/doc2vec_models/.done'
+    run_tasks(train_doc2vec_a_politician, tasks, args.workers, marker_dir, args.rerun, name='doc2vec')
 
-    train_doc2vec_for_all_politician(data_dirname, debug)
+    train_doc2vec_for_all_politician(data_dirname, corpus_dirname, debug, rebuild_corpus)
     print('trained all politician doc2vec model\nTerminated')
 
 if __name__ == '__main__':
@@ -1,9 +1,9 @@
 import argparse
-import numpy as np
 import os
-import pickle
 from politicianmap.utils import News, Tokenizer, Stopwords, Tagfilter, check_dir
+from politicianmap.utils import add_parallel_arguments, run_tasks
 from politicianmap.representation import RepresentationGenerator
+from politicianmap.representation import DocvecStore, inference_key, model_fingerprint
 
 
 def write_list(path, items):
@@ -11,13 +11,7 @@ def write_list(path, items):
         for item in items:
             f.write('{}\n'.format(item))
 
-def train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path, out_dirname, head, debug):
-    # load trained doc2vec
-    encoder = RepresentationGenerator(
-        doc2vec_path,
-        Tokenizer(Tagfilter({'R'}))
-    )
-
+def train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path, out_dirname, head, debug, infer_workers=1):
     # variables for debug
     begin_date, end_date = '2018-01-01', '2018-01-10'
 
@@ -27,27 +21,51 @@ def train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path
     else:
         news = News('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx))
 
-    date_docvecs = []
-    n_dates = len(news.date_to_ndocs)
-    for i, (date, n_docs) in enumerate(news.date_to_ndocs):
-        if i % 100 == 99:
-            print('\r[Politician {}, {}] Infering ... {} / {}'.format(idx, head, i+1, n_dates))
-        if n_docs < 15:
+    # find dates whose model, news file or parameters changed
+    store = DocvecStore('{}/{}_{}_docvec'.format(out_dirname, head, idx))
+    params = {'steps': 100, 'seed': 0, 'alpha': 0.025, 'min_alpha': 0.01, 'tagfilter': 'R'}
+    model_key = model_fingerprint(doc2vec_path)
+    dates, date_to_key = [], {}
+    news_dates = set(news.dates)
+    for date, n_docs in news.date_to_ndocs:
+        # dates of index files may have no news file
+        if n_docs < 15 or date not in news_dates:
             continue
-        vec = encoder.infer_docvec(news.get_news(date, date), steps=100)
-        date_docvecs.append((date, vec))
+        dates.append(date)
+        date_to_key[date] = inference_key(model_key, store.content_key(news.get_path(date)), params)
+    todo = [date for date in dates if store.get(date, date_to_key[date]) is None]
+    print('[Politician {}, {}] Infering {} / {} dates ...'.format(idx, head, len(todo), len(dates)))
+
+    if todo:
+        # load trained doc2vec
+        encoder = RepresentationGenerator(
+            doc2vec_path,
+            Tokenizer(Tagfilter({params['tagfilter']})).compile(),
+            alpha=params['alpha'],
+            min_alpha=params['min_alpha']
+        )
+        date_docs = ((date, news.get_news(date, date)) for date in todo)
+        for date, vec in encoder.infer_many(date_docs, n_jobs=infer_workers, steps=params['steps'], seed=params['seed']):
+            store.append(date, date_to_key[date], vec)
 
-    dates, docvecs = zip(*date_docvecs)
-    docvecs = np.vstack([vec.reshape(1,-1) for vec in docvecs])
+    docvecs = store.vectors(dates)
     print('\r[Politician {}, {}] Infering was done. docvecs shape ={}'.format(idx, head, docvecs.shape))
 
-    # write date
+    # write date. Doc vectors of the dates are store.vectors(dates)
     path = '{}/date_{}.txt'.format(out_dirname, idx)
     check_dir(path)
     write_list(path, dates)
-    # write doc vectors
-    with open('{}/{}_{}_docvec.pkl'.format(out_dirname, head, idx), 'wb') as f:
-        pickle.dump(docvecs, f)
+
+def infer_docvec_a_politician(data_dirname, index_dirname, idx, doc2vec_model_dirname, out_dirname, debug, infer_workers):
+    head = 'each'
+    doc2vec_path = '{}/doc2vec_docvec_politician_{}.model'.format(doc2vec_model_dirname, idx)
+    train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path, out_dirname, head, debug, infer_workers)
+    print('infered politician {} with each doc2vec model'.format(idx), end='\n\n')
+
+    head = 'universial'
+    doc2vec_path = '{}/doc2vec_docvec_politician_all.model'.format(doc2vec_model_dirname)
+    train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path, out_dirname, head, debug, infer_workers)
+    print('infered politician {} with universial doc2vec model'.format(idx), end='\n\n')
 
 def main():
     parser = argparse.ArgumentParser()
@@ -57,6 +75,9 @@ def main():
     parser.add_argument('--out_dirname', type=str, default='/workspace/lovit/politicianmap/docvec_infered/')
     parser.add_argument('--politician', type=int, nargs='*', default=None)
     parser.add_argument('--debug', dest='debug', action='store_true')
+    parser.add_argument('--infer_workers', type=int, default=1,
+        help='Number of processes for inference of a politician')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     data_dirname = os.path.abspath(args.data_dirname)
@@ -70,18 +91,13 @@ def main():
     if politician is None:
         politician = [i for i in range(20)]
 
-    for idx in politician:
-        head = 'each'
-        doc2vec_path = '{}/doc2vec_docvec_politician_{}.pkl'.format(doc2vec_model_dirname, idx)
-        train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path, out_dirname, head, debug)
-        print('infered politician {} with each doc2vec model'.format(idx), end='\n\n')
-
-        head = 'universial'
-        doc2vec_path = '{}/doc2vec_docvec_politician_all.pkl'.format(doc2vec_model_dirname)
-        train_docvec_for_a_politician(data_dirname, index_dirname, idx, doc2vec_path, out_dirname, head, debug)
-        print('infered politician {} with universial doc2vec model'.format(idx), end='\n\n')
-        if debug and idx >= 3:
-            break
+    if debug:
+        politician = politician[:4]
+
+    tasks = [(idx, (data_dirname, index_dirname, idx, doc2vec_model_dirname, out_dirname, debug, args.infer_workers))
+             for idx in politician]
+    marker_dir = None if debug else '{}/.done'.format(out_dirname)
+    run_tasks(infer_docvec_a_politician, tasks, args.workers, marker_dir, args.rerun, name='doc2vec_inference')
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,23 @@
+import argparse
+import os
+from glob import glob
+from politicianmap.representation import load_doc2vec, save_doc2vec
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--doc2vec_model_dirname', type=str, default='/workspace/lovit/politicianmap/doc2vec_models/')
+
+    args = parser.parse_args()
+    doc2vec_model_dirname = os.path.abspath(args.doc2vec_model_dirname)
+
+    # convert pickled models to memory-mappable format
+    for path in sorted(glob('{}/*.pkl'.format(doc2vec_model_dirname))):
+        model_path = path[:-4] + '.model'
+        if os.path.exists(model_path):
+            continue
+        save_doc2vec(load_doc2vec(path), model_path)
+        print('converted {} -> {}'.format(path, model_path))
+
+if __name__ == '__main__':
+    main()
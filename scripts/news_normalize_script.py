@@ -4,41 +4,79 @@ import os
 from glob import glob
 from shutil import copyfile
 from politicianmap.utils import check_dir
+from politicianmap.utils import parse_date
+from politicianmap.utils import add_parallel_arguments, run_tasks
 
 
+text_chars = 'ㄱ-ㅎㅏ-ㅣ가-힣a-zA-Z0-9'
 doublespace_pattern = re.compile('\s+')
-text_filter = re.compile('[^ㄱ-ㅎㅏ-ㅣ가-힣a-zA-Z0-9]')
+text_filter = re.compile('[^{}]'.format(text_chars))
+# a run of non-text characters between two text characters. Sentences are
+# separated by double space, so a run containing double space is sentence boundary.
+# Lines of text file never contain '\n', and it is used as boundary marker
+sentence_boundary = re.compile('[^{0}]*  [^{0}]*'.format(text_chars))
+non_text = re.compile('[^{}\n]+'.format(text_chars))
 
 def only_text(sent):
     return doublespace_pattern.sub(' ',text_filter.sub(' ', sent)).strip()
 
 def normalize(doc):
-    doc = [only_text(sent) for sent in doc.split('  ')]
-    doc = [sent for sent in doc if sent]
-    if not doc:
-        return ''
-    return '  '.join(doc)
+    """
+    Same with '  '.join(only_text(sent) for sent in doc.split('  ') if only_text(sent)),
+    but it processes whole document with two regular expression substitutions
+    """
+    doc = sentence_boundary.sub('\n', doc)
+    doc = non_text.sub(' ', doc)
+    return doc.strip().replace('\n', '  ')
 
-def normalize_a_politician(source_dir, idx, dest_dir, debug):
+def is_up_to_date(dest, source):
+    return os.path.exists(dest) and os.path.getmtime(dest) >= os.path.getmtime(source)
+
+def normalize_file(inpath, outpath):
+    check_dir(outpath)
+    # write to temporal file and rename it, so an interrupted file is not regarded as up to date
+    with open(inpath, encoding='utf-8') as fi, open(outpath + '.tmp', 'w', encoding='utf-8') as fo:
+        for doc in fi:
+            fo.write('{}\n'.format(normalize(doc)))
+    os.replace(outpath + '.tmp', outpath)
+
+def normalize_files(source_dir, dest_dir, paths, rerun=False):
+    n_normalized = 0
+    for inpath in paths:
+        outpath = dest_dir + inpath[len(source_dir):]
+        index_source = inpath[:-3] + 'index'
+        index_dest = dest_dir + index_source[len(source_dir):]
+        if rerun or not is_up_to_date(outpath, inpath):
+            normalize_file(inpath, outpath)
+            n_normalized += 1
+        if rerun or not is_up_to_date(index_dest, index_source):
+            copyfile(index_source, index_dest)
+    return n_normalized
+
+def file_tasks(source_dir, idx, dest_dir, debug, rerun):
+    """
+    Group files of a politician by month. Files whose destination
+    is newer than source are excluded unless rerun is True
+    """
     paths = sorted(glob('{}/{}/news/*.txt'.format(source_dir, idx)))
     if debug:
         paths = paths[:10]
 
+    month_to_paths = {}
     for inpath in paths:
         outpath = dest_dir + inpath[len(source_dir):]
-        check_dir(outpath)
-        with open(inpath, encoding='utf-8') as f:
-            docs = [doc.strip() for doc in f]
-
-        docs = [normalize(doc) for doc in docs]
-        with open(outpath, 'w', encoding='utf-8') as f:
-            for doc in docs:
-                f.write('{}\n'.format(doc))
-
         index_source = inpath[:-3] + 'index'
         index_dest = dest_dir + index_source[len(source_dir):]
-        copyfile(index_source, index_dest)
-        print('normalized {}'.format(inpath))
+        if not rerun and is_up_to_date(outpath, inpath) and is_up_to_date(index_dest, index_source):
+            continue
+        month = parse_date(inpath)[:7]
+        month_to_paths.setdefault(month, []).append(inpath)
+
+    n_skips = len(paths) - sum(len(p) for p in month_to_paths.values())
+    if n_skips > 0:
+        print('[normalize] skip {} files of politician {} (up to date)'.format(n_skips, idx))
+    return [('{}_{}'.format(idx, month), (source_dir, dest_dir, month_paths, rerun))
+            for month, month_paths in sorted(month_to_paths.items())]
 
 def main():
     parser = argparse.ArgumentParser()
@@ -46,6 +84,7 @@ def main():
     parser.add_argument('--dest_dir', type=str, default='/workspace/data/politician_norm/')
     parser.add_argument('--politician', type=int, nargs='*', default=None)
     parser.add_argument('--debug', dest='debug', action='store_true')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     source_dir = os.path.abspath(args.source_dir)
@@ -55,8 +94,9 @@ def main():
     if politician is None:
         politician = [i for i in range(20)]
 
-    for idx in politician:
-        normalize_a_politician(source_dir, idx, dest_dir, debug)
+    tasks = [task for idx in politician for task in
+             file_tasks(source_dir, idx, dest_dir, debug, args.rerun)]
+    run_tasks(normalize_files, tasks, args.workers, name='normalize')
 
 if __name__ == '__main__':
     main()
@@ -1,7 +1,11 @@
 import argparse
 import os
+from bisect import bisect_left
+from bisect import bisect_right
 from politicianmap.utils import check_dir
+from politicianmap.utils import load_manifest
 from politicianmap.utils import News
+from politicianmap.utils import add_parallel_arguments, run_tasks
 from soynlp.noun import LRNounExtractor_v2
 
 
@@ -13,23 +17,51 @@ def iter_dates():
     dates.append(('2019-01-01', '2019-03-10'))
     return dates
 
-def noun_extraction(data_dirname, index_dirname, noun_dirname, idx, debug=False):
-    for begin_date, end_date in iter_dates():
-        news = News(
-            '{}/{}/'.format(data_dirname, idx),
-            '{}/{}/'.format(index_dirname, idx),
-            begin_date, end_date
-        )
-        noun_extractor = LRNounExtractor_v2(extract_compound=True, verbose=False)
-        noun_score = noun_extractor.train_extract(news)
-        path = '{}/{}/{}_{}'.format(noun_dirname, idx, begin_date, end_date)
-        check_dir(path)
-        with open(path, 'w', encoding='utf-8') as f:
-            for noun, score in sorted(noun_score.items(), key=lambda x:-x[1].frequency):
-                f.write('%s %d %.4f\n' % (noun, score.frequency, score.score))
-        print('noun extraction idx = {}, {} - {} done\n'.format(idx, begin_date, end_date))
-        if debug:
-            break
+# manifest (date index) of each politician. It is loaded once in main process
+# and inherited by forked worker processes
+_manifests = {}
+
+def get_manifest(data_dirname, index_dirname, idx):
+    if idx not in _manifests:
+        _manifests[idx] = load_manifest('{}/{}/'.format(data_dirname, idx), '{}/{}/'.format(index_dirname, idx))
+    return _manifests[idx]
+
+def noun_path(noun_dirname, idx, begin_date, end_date):
+    return '{}/{}/{}_{}'.format(noun_dirname, idx, begin_date, end_date)
+
+def window_inputs(manifest, begin_date, end_date):
+    """news and index files of the window"""
+    dates = manifest['dates']
+    b = bisect_left(dates, begin_date)
+    e = bisect_right(dates, end_date)
+    return [p for i in range(b, e) for p in (manifest['newspath'][i], manifest['indexpath'][i]) if p]
+
+def is_up_to_date(path, inputs):
+    """True if path exists and it is newer than all inputs"""
+    if not os.path.exists(path):
+        return False
+    return os.path.getmtime(path) >= max(os.path.getmtime(p) for p in inputs)
+
+def noun_extraction(data_dirname, index_dirname, noun_dirname, idx, begin_date, end_date):
+    news = News(
+        '{}/{}/'.format(data_dirname, idx),
+        '{}/{}/'.format(index_dirname, idx),
+        begin_date, end_date,
+        manifest=get_manifest(data_dirname, index_dirname, idx)
+    )
+    noun_extractor = LRNounExtractor_v2(extract_compound=True, verbose=False)
+    noun_score = noun_extractor.train_extract(news)
+    path = noun_path(noun_dirname, idx, begin_date, end_date)
+    check_dir(path)
+    # write to temporal file and rename it, so a killed task does not leave
+    # incomplete dictionary which looks up to date. The temporal file is not in
+    # dictionary directory {noun_dirname}/{idx}/, which is read by tokenizer
+    tmp_path = '{}/.tmp/{}_{}_{}.{}'.format(noun_dirname, idx, begin_date, end_date, os.getpid())
+    check_dir(tmp_path)
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        for noun, score in sorted(noun_score.items(), key=lambda x:-x[1].frequency):
+            f.write('%s %d %.4f\n' % (noun, score.frequency, score.score))
+    os.replace(tmp_path, path)
 
 def main():
     parser = argparse.ArgumentParser()
@@ -38,6 +70,7 @@ def main():
     parser.add_argument('--noun_dirname', type=str, default='/workspace/lovit/politicianmap/noun_extraction/')
     parser.add_argument('--politician', type=int, nargs='*', default=None)
     parser.add_argument('--debug', dest='debug', action='store_true')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     data_dirname = os.path.abspath(args.data_dirname)
@@ -48,9 +81,28 @@ def main():
     if politician is None:
         politician = [i for i in range(20)]
 
+    if debug:
+        politician = politician[:4]
+
+    windows = iter_dates()
+    if debug:
+        windows = windows[:1]
+
+    # (politician, window) tasks. Windows whose dictionary is newer than news are skipped
+    tasks = []
     for idx in politician:
-        noun_extraction(data_dirname, index_dirname, noun_dirname, idx, debug)
-        print('-' *40, end='\n\n')
+        manifest = get_manifest(data_dirname, index_dirname, idx)
+        for begin_date, end_date in windows:
+            inputs = window_inputs(manifest, begin_date, end_date)
+            if not inputs:
+                continue
+            path = noun_path(noun_dirname, idx, begin_date, end_date)
+            if not args.rerun and is_up_to_date(path, inputs):
+                print('[noun_extraction] skip {} {} - {} (up to date)'.format(idx, begin_date, end_date))
+                continue
+            key = '{}_{}_{}'.format(idx, begin_date, end_date)
+            tasks.append((key, (data_dirname, index_dirname, noun_dirname, idx, begin_date, end_date)))
+    run_tasks(noun_extraction, tasks, args.workers, name='noun_extraction')
 
 if __name__ == '__main__':
     main()
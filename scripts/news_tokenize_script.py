@@ -1,8 +1,12 @@
 import argparse
 import os
+import re
+import time
+from bisect import bisect_left
 from glob import glob
 from politicianmap.utils import News
 from politicianmap.utils import parse_date, line_counts, check_dir, load_docs
+from politicianmap.utils import add_parallel_arguments, run_tasks
 from soynlp.tokenizer import LTokenizer
 
 
@@ -14,43 +18,81 @@ def iter_dates():
     dates.append(('2019-01-01', '2019-03-10'))
     return dates
 
-def load_dictionary(noun_dirname, idx):
-    dictionary_paths = sorted(glob('{}/{}/*'.format(noun_dirname, idx)))
+window_pattern = re.compile(r'\d{4}-\d{2}-\d{2}_\d{4}-\d{2}-\d{2}')
 
+def load_windows(noun_dirname, idx):
+    """
+    Returns
+    -------
+    list of tuple
+        (begin date, end date, dictionary path) sorted by date
+    """
     def date(path):
         bd, ed = path.split('/')[-1].split('_')
         return bd, ed
 
-    def load(path):
-        with open(path, encoding='utf-8') as f:
-            nouns = [line.strip().split() for line in f]
-            # (noun, frequency, score)
-            nouns = {w:float(s) for w, _, s in nouns}
-        return nouns
-
-    dictionaries = [(*date(p), load(p)) for p in dictionary_paths]
-    return dictionaries
-
-def select_dictionary(path, dictionaries):
+    # only yyyy-mm-dd_yyyy-mm-dd files. Others such as temporal files are ignored
+    dictionary_paths = [p for p in sorted(glob('{}/{}/*'.format(noun_dirname, idx)))
+                        if window_pattern.fullmatch(os.path.basename(p))]
+    return [(*date(p), p) for p in dictionary_paths]
+
+def load_dictionary(path):
+    with open(path, encoding='utf-8') as f:
+        nouns = [line.strip().split() for line in f]
+        # (noun, frequency, score)
+        nouns = {w:float(s) for w, _, s in nouns}
+    return nouns
+
+def select_window(path, windows, end_dates):
+    """
+    Returns the first window which contains date of path.
+    Windows are sorted and overlapped, so it is the first window whose end date is not before the date
+    """
     date = parse_date(path)
-    for bd, ed, dictionary in dictionaries:
-        if bd <= date <= ed:
-            return dictionary
-    raise ValueError('Not found available dictionary')
-
-def tokenize(docs, dictionary):
-    tokenizer = LTokenizer(scores = dictionary)
-
-    def tokenize_sent(sent):
-        sent_ = []
-        for l, r in tokenizer.tokenize(sent, flatten=False):
-            sent_.append(l)
-            if r:
-                sent_.append(r+'/R')
-        return ' '.join(sent_)
-
-    docs = ['  '.join([tokenize_sent(sent) for sent in doc.split('  ')]) for doc in docs]
-    return docs
+    i = bisect_left(end_dates, date)
+    if i == len(windows) or windows[i][0] > date:
+        raise ValueError('Not found available dictionary')
+    return windows[i]
+
+
+class EojeolTokenizer:
+    """
+    LTokenizer with memo of eojeol -> tokenized string.
+    LTokenizer splits each eojeol independently, so the memo gives same output
+    with LTokenizer and news text repeats same eojeols heavily.
+
+        >>> tokenizer = EojeolTokenizer(dictionary)
+        >>> docs = tokenizer.tokenize_docs(load_docs(path))
+        >>> tokenizer.n_hits / tokenizer.n_eojeols
+    """
+
+    def __init__(self, dictionary):
+        self.tokenizer = LTokenizer(scores = dictionary)
+        self.memo = {}
+        self.n_eojeols = 0
+
+    @property
+    def n_hits(self):
+        return self.n_eojeols - len(self.memo)
+
+    def tokenize_eojeol(self, eojeol):
+        l, r = self.tokenizer.tokenize(eojeol, flatten=False)[0]
+        return '{} {}/R'.format(l, r) if r else l
+
+    def tokenize_sent(self, sent):
+        memo = self.memo
+        tokens = []
+        for eojeol in sent.split():
+            token = memo.get(eojeol)
+            if token is None:
+                token = self.tokenize_eojeol(eojeol)
+                memo[eojeol] = token
+            tokens.append(token)
+        self.n_eojeols += len(tokens)
+        return ' '.join(tokens)
+
+    def tokenize_docs(self, docs):
+        return ['  '.join([self.tokenize_sent(sent) for sent in doc.split('  ')]) for doc in docs]
 
 def write_docs(docs, path):
     check_dir(path)
@@ -58,19 +100,56 @@ def write_docs(docs, path):
         for doc in docs:
             f.write('{}\n'.format(doc))
 
-def tokenize_a_politician(data_dirname, noun_dirname, idx, dest_dirname, debug):
+def tokenize_a_window(dictionary_path, inpaths, data_dirname, dest_dirname):
+    """
+    Tokenize news files of a dictionary window with one tokenizer and memo.
+
+    Returns
+    -------
+    dict
+        Statistics of files, docs, eojeols, memo hits and seconds
+    """
+    begin_time = time.time()
+    tokenizer = EojeolTokenizer(load_dictionary(dictionary_path))
+    n_docs = 0
+    for inpath in inpaths:
+        outpath = dest_dirname + inpath[len(data_dirname):]
+        docs = tokenizer.tokenize_docs(load_docs(inpath))
+        write_docs(docs, outpath)
+        n_docs += len(docs)
+    return {
+        'files': len(inpaths),
+        'docs': n_docs,
+        'eojeols': tokenizer.n_eojeols,
+        'hits': tokenizer.n_hits,
+        'seconds': time.time() - begin_time
+    }
+
+def window_tasks(data_dirname, noun_dirname, idx, dest_dirname, debug):
+    """Group news files of a politician by dictionary window"""
     paths = sorted(glob('{}/{}/news/*.txt'.format(data_dirname, idx)))
     if debug:
         paths = paths[:3]
-    dictionaries = load_dictionary(noun_dirname, idx)
-
-    for inpath in paths:
-        outpath = dest_dirname + inpath[len(data_dirname):]
-        dictionary = select_dictionary(inpath, dictionaries)
-        docs = load_docs(inpath)
-        docs = tokenize(docs, dictionary)
-        write_docs(docs, outpath)
-        print('tokenized {}'.format(inpath))
+    windows = load_windows(noun_dirname, idx)
+    end_dates = [ed for _, ed, _ in windows]
+
+    window_to_paths = {}
+    for path in paths:
+        try:
+            window = select_window(path, windows, end_dates)
+        except ValueError:
+            print('[tokenize] skip {} (not found available dictionary)'.format(path))
+            continue
+        window_to_paths.setdefault(window, []).append(path)
+
+    # completion marker depends on number and latest mtime of inputs,
+    # so a window is tokenized again when news files are added or updated
+    tasks = []
+    for (bd, ed, dictionary_path), inpaths in sorted(window_to_paths.items()):
+        mtime = int(max(os.path.getmtime(p) for p in inpaths + [dictionary_path]))
+        key = '{}_{}_{}_{}files_{}'.format(idx, bd, ed, len(inpaths), mtime)
+        tasks.append((key, (dictionary_path, inpaths, data_dirname, dest_dirname)))
+    return tasks
 
 def main():
     parser = argparse.ArgumentParser()
@@ -79,6 +158,7 @@ def main():
     parser.add_argument('--dest_dirname', type=str, default='/workspace/lovit/politicianmap/tokenized/')
     parser.add_argument('--politician', type=int, nargs='*', default=None)
     parser.add_argument('--debug', dest='debug', action='store_true')
+    add_parallel_arguments(parser)
 
     args = parser.parse_args()
     data_dirname = os.path.abspath(args.data_dirname)
@@ -89,11 +169,28 @@ def main():
     if politician is None:
         politician = [i for i in range(20)]
 
-    for idx in politician:
-        tokenize_a_politician(data_dirname, noun_dirname, idx, dest_dirname, debug)
-        print()
-        if debug and idx >= 3:
-            break
+    if debug:
+        politician = politician[:4]
+
+    tasks = [task for idx in politician for task in
+             window_tasks(data_dirname, noun_dirname, idx, dest_dirname, debug)]
+    marker_dir = None if debug else '{}/.done'.format(dest_dirname)
+
+    stats = {'files': 0, 'docs': 0, 'eojeols': 0, 'hits': 0, 'seconds': 0}
+    def accumulate(key, result):
+        for name, value in result.items():
+            stats[name] += value
+
+    begin_time = time.time()
+    run_tasks(tokenize_a_window, tasks, args.workers, marker_dir, args.rerun,
+        name='tokenize', callback=accumulate)
+    elapsed = time.time() - begin_time
+
+    print('tokenized {} files, {} docs, {} eojeols'.format(
+        stats['files'], stats['docs'], stats['eojeols']))
+    print('memo hit rate = {:.4f}'.format(stats['hits'] / max(1, stats['eojeols'])))
+    print('throughput = {:.1f} eojeols/sec ({:.1f} eojeols/sec per process, {:.1f} sec)'.format(
+        stats['eojeols'] / max(elapsed, 1e-9), stats['eojeols'] / max(stats['seconds'], 1e-9), elapsed))
 
 if __name__ == '__main__':
     main()
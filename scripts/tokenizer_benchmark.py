@@ -0,0 +1,60 @@
+import argparse
+import random
+import time
+from politicianmap.utils import Tokenizer, Stopwords, Tagfilter
+
+
+def make_synthetic_docs(n_docs, n_vocab, doc_len, duplicate, seed=0):
+    random.seed(seed)
+    nouns = ['w{}'.format(i) for i in range(n_vocab)]
+    # R part of LTokenizer output such as 은/R, 이다/R
+    r_words = ['r{}/R'.format(i) for i in range(100)]
+    weights = [1 / (i + 1) for i in range(n_vocab)]
+    def make_doc():
+        words = random.choices(nouns, weights=weights, k=doc_len)
+        return ' '.join(w if random.random() < 0.6 else w + ' ' + random.choice(r_words) for w in words)
+    n_unique = max(1, int(n_docs * (1 - duplicate)))
+    unique_docs = [make_doc() for _ in range(n_unique)]
+    # news have many duplicated articles
+    docs = unique_docs + random.choices(unique_docs, k=n_docs - n_unique)
+    random.shuffle(docs)
+    stopwords = set(nouns[:50])
+    return docs, stopwords
+
+def measure(tokenizer, docs):
+    begin_time = time.time()
+    tokenized = [tokenizer(doc) for doc in docs]
+    elapsed = time.time() - begin_time
+    return tokenized, elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--n_docs', type=int, default=50000)
+    parser.add_argument('--n_vocab', type=int, default=50000)
+    parser.add_argument('--doc_len', type=int, default=200)
+    parser.add_argument('--duplicate', type=float, default=0.3, help='Ratio of duplicated documents')
+    parser.add_argument('--cache_size', type=int, default=10000)
+
+    args = parser.parse_args()
+    docs, stopwords = make_synthetic_docs(args.n_docs, args.n_vocab, args.doc_len, args.duplicate)
+    n_words = sum(len(doc.split()) for doc in docs)
+    print('synthetic docs: {} docs, {} words, {:.0%} duplicated'.format(len(docs), n_words, args.duplicate))
+
+    tokenizer = Tokenizer(Stopwords(stopwords), Tagfilter({'/R'}))
+    tokenizers = [
+        ('filters', tokenizer),
+        ('fused', tokenizer.compile()),
+        ('fused+cache', tokenizer.compile(cache_size=args.cache_size))
+    ]
+
+    expected = None
+    print('{:<12} {:>10} {:>14}'.format('tokenizer', 'time (sec)', 'words/sec'))
+    for name, tokenizer in tokenizers:
+        tokenized, elapsed = measure(tokenizer, docs)
+        if expected is None:
+            expected = tokenized
+        assert tokenized == expected
+        print('{:<12} {:>10.2f} {:>14.0f}'.format(name, elapsed, n_words / elapsed))
+
+if __name__ == '__main__':
+    main()